@@ -1,26 +1,36 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 from datetime import datetime, timedelta, date
 import os
 import glob
 import json
+import hashlib
 import calendar
 import urllib.parse
+from collections import deque
+from html import escape
 import time
+import threading
 import streamlit_antd_components as sac
 from google_calendar_utils import get_calendar_service, add_event_to_calendar, get_credentials, get_user_info
 from google_sheets_utils import GoogleSheetsManager
 import app_translations as tr
 from app_translations import TRANSLATIONS
-from sklearn.preprocessing import LabelEncoder
-
-from sklearn.ensemble import RandomForestRegressor
 import ai_utils
 from flashcard_data import FLASHCARD_DATA
 
+# グラフのJSON化は orjson があればそちらを使う（標準 json より高速）
+try:
+    import orjson  # noqa: F401
+    pio.json.config.default_engine = "orjson"
+except ImportError:
+    pass
+
 # Load translations
 if "language" not in st.session_state:
     st.session_state.language = "日本語" # Default language
@@ -93,6 +103,38 @@ div[data-testid="stTextInput"] input:focus, div[data-testid="stNumberInput"] inp
     border-color: #3b82f6;
     box-shadow: 0 0 0 2px rgba(59, 130, 246, 0.2);
 }
+
+/* Custom toast (slide in, then fade out) */
+@keyframes slideInFadeOut {
+    0% { transform: translateX(100%); opacity: 0; }
+    10% { transform: translateX(0); opacity: 1; }
+    80% { transform: translateX(0); opacity: 1; }
+    100% { transform: translateX(100%); opacity: 0; visibility: hidden; }
+}
+.custom-toast {
+    position: fixed;
+    top: 100px;
+    right: 20px;
+    background-color: #ffffff;
+    border-left: 5px solid #10b981;
+    padding: 16px 24px;
+    border-radius: 8px;
+    box-shadow: 0 10px 15px -3px rgba(0, 0, 0, 0.1), 0 4px 6px -2px rgba(0, 0, 0, 0.05);
+    display: flex;
+    align-items: center;
+    gap: 12px;
+    z-index: 10000;
+    animation: slideInFadeOut 4s forwards;
+}
+.toast-icon {
+    color: #10b981;
+    font-size: 1.5rem;
+}
+.toast-message {
+    color: #1f2937;
+    font-weight: 600;
+    font-size: 1rem;
+}
 </style>
 """, unsafe_allow_html=True)
 
@@ -109,6 +151,89 @@ def t(key):
 def dt(text):
     return tr.get_data_text(text, st.session_state.get("language", "日本語"))
 
+def dt_series(s):
+    """
+    Series版の dt。言語の翻訳辞書を一度だけ引き、辞書にない値はそのまま返す
+    """
+    lang = st.session_state.get("language", "日本語")
+    table = tr.DATA_TRANSLATIONS.get(lang) if lang != "日本語" else None
+    if not table:
+        return s
+    # category 列ならカテゴリ単位でしか呼ばれない
+    return s.map(lambda v: table.get(v, v))
+
+def _frame_hash(d):
+    """
+    DataFrame内容の64bitハッシュ（変更検出用。インデックスは無視、行の並び替えも検出する）
+    """
+    row_hashes = pd.util.hash_pandas_object(d, index=False).to_numpy()
+    return int.from_bytes(hashlib.blake2b(row_hashes.tobytes(), digest_size=8).digest(), "little")
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _csv_bytes(df_key, _df):
+    """
+    ダウンロード用CSVバイト列（_df はハッシュ対象外、df_key で内容の変化を判定）
+    """
+    return _df.to_csv(index=False).encode('utf-8-sig')
+
+def csv_bytes(d):
+    """
+    内容が変わった時だけCSVを再生成する
+    """
+    return _csv_bytes((_frame_hash(d), tuple(d.columns)), d)
+
+def set_notes(notes):
+    """
+    ノートをセッションに置き、検索用の文字列化済み列も同時に作っておく
+    （読み込み・削除などノートが変わった時だけ文字列化し、検索の入力ごとにはしない）
+    """
+    st.session_state.df_notes = notes
+    st.session_state.df_notes_search = (notes["問題ID"].astype(str), notes["メモ"].astype(str))
+
+@st.cache_resource
+def _notes_backup_state():
+    """
+    ノートのローカル保存の共有状態（最新スナップショットと書き込みスレッドの有無。再実行をまたいで共有）
+    """
+    return {"lock": threading.Lock(), "pending": None, "running": False}
+
+def save_notes_backup(notes, path):
+    """
+    ノートのローカルCSVバックアップを別スレッドで書き出す（UIのコールバックを待たせない）
+    書き込みスレッドは常に1本で、毎回その時点の最新スナップショットを書くため、古い内容で上書きされない
+    """
+    state = _notes_backup_state()
+    with state["lock"]:
+        state["pending"] = (notes.copy(), path)
+        if state["running"]:
+            # 動いている書き込みスレッドが、書き終えた後に最新分を拾う
+            return
+        state["running"] = True
+    
+    def _write():
+        while True:
+            with state["lock"]:
+                job, state["pending"] = state["pending"], None
+                if job is None:
+                    state["running"] = False
+                    return
+            snapshot, out_path = job
+            try:
+                snapshot.to_csv(out_path, index=False)
+            except Exception:
+                # バックアップの失敗でスレッドを止めない（次のスナップショットで再度書く）
+                pass
+    
+    threading.Thread(target=_write, daemon=True).start()
+
+def _df_fingerprint(d):
+    """
+    キャッシュキー用のDataFrame指紋（行数・列名・内容ハッシュ）
+    データエディタで日付以外の列や途中の行だけを直しても、キャッシュが古い結果を返さないよう内容まで見る
+    全セルを走査するので、ログについては取り込み後に一度だけ計算して df_key として各キャッシュ関数に渡す
+    """
+    return (len(d), tuple(d.columns), _frame_hash(d))
+
 # --- 安全な再実行トリガ（環境差分を吸収） ---
 def trigger_rerun():
     """
@@ -130,45 +255,49 @@ def trigger_rerun():
     except Exception:
         return
 
-@st.cache_resource
-def train_ai_models(df):
+@st.cache_resource(show_spinner=False)
+def train_ai_models(df_key, _df):
     """
     機械学習モデルの学習（キャッシュ化）
     Random Forestを用いて正答率を予測し、重要変数を抽出する
     """
     # データが少なすぎる場合は学習しない
-    if df.empty or len(df) < 5:
+    if _df.empty or len(_df) < 5:
         return None, None, None
     
     try:
-        # データ前処理
-        df_ml = df.copy()
-        df_ml["date_obj"] = pd.to_datetime(df_ml["日付"])
+        # scikit-learn はAI分析タブでしか使わないため、初回学習時に読み込む
+        from sklearn.ensemble import RandomForestRegressor
+        
+        # データ前処理（日付は取り込み時に datetime 化済み）
+        date_obj = _df["日付"]
         # 基準日からの経過日数
-        min_date = df_ml["date_obj"].min()
-        df_ml["days_passed"] = (df_ml["date_obj"] - min_date).dt.days
+        min_date = date_obj.min()
         # 正誤を数値化 (1/0)
-        df_ml["is_correct"] = df_ml["正誤"].apply(lambda x: 1 if x == "〇" else 0)
-        
-        # 欠損値処理
-        df_ml = df_ml.fillna(0)
-        
-        # カテゴリ変数のエンコーディング
-        le_subj = LabelEncoder()
-        le_unit = LabelEncoder()
+        y = _df["_correct"].to_numpy()
         
-        # 文字列型に変換してからエンコード
-        df_ml["subj_code"] = le_subj.fit_transform(df_ml["科目"].astype(str))
-        df_ml["unit_code"] = le_unit.fit_transform(df_ml["単元"].astype(str))
+        # カテゴリ変数のエンコーディング（カテゴリはソート済みなので LabelEncoder と同じコードになる）
+        subj_cats = _df["科目"].astype(str).astype("category")
+        unit_cats = _df["単元"].astype(str).astype("category")
         
         # 特徴量: 経過日数, 科目, 単元, 解答時間, 学習投入時間
         # ※本来はOneHotEncodingすべきだが、決定木ベースなのでLabelEncodingでも許容
-        X = df_ml[["days_passed", "subj_code", "unit_code", "解答時間(秒)", "学習投入時間(分)"]]
-        y = df_ml["is_correct"]
+        # 木の予測は内部で float32 に変換されるため、最初から float32 の配列で学習する（欠損値は0）
+        X = pd.DataFrame({
+            "days_passed": (date_obj - min_date).dt.days,
+            "subj_code": subj_cats.cat.codes,
+            "unit_code": unit_cats.cat.codes,
+            "解答時間(秒)": _df["解答時間(秒)"],
+            "学習投入時間(分)": _df["学習投入時間(分)"],
+        }).fillna(0).to_numpy(dtype=np.float32)
         
         # モデル学習 (Random Forest Regressor)
         # 0/1の分類ではなく、確率(正答率)として予測したいので回帰モデルを使用
-        model = RandomForestRegressor(n_estimators=50, max_depth=5, random_state=42, n_jobs=-1)
+        # 木の本数を抑え、ログが多い場合は各木のブートストラップ標本を約2000行に制限して学習を軽くする
+        model = RandomForestRegressor(
+            n_estimators=32, max_depth=5, max_samples=min(1.0, 2000 / len(_df)),
+            random_state=42, n_jobs=-1
+        )
         model.fit(X, y)
         
         # 変数重要度
@@ -177,13 +306,88 @@ def train_ai_models(df):
             "importance": model.feature_importances_
         }).sort_values("importance", ascending=False)
         
-        return model, importances, (le_subj, le_unit, min_date)
+        return model, importances, (subj_cats.cat.categories, unit_cats.cat.categories, min_date)
         
     except Exception as e:
         st.error(f"AI学習エラー: {e}")
         return None, None, None
 
-def generate_weekly_study_plan(df, exam_date, target_rate, current_rate):
+@st.cache_data(ttl=3600, show_spinner=False)
+def _ai_predictions(df_key, _df, days_future, current_days, n_future=30):
+    """
+    AIタブの予測値一式（キャッシュ化）
+    指定日の全単元平均・そこから30日間の推移・今日時点の単元別予測を返す
+    """
+    model, _, (subj_classes, unit_classes, _) = train_ai_models(df_key, _df)
+    
+    # 予測用ダミーデータ作成（平均的な学習条件で予測）
+    avg_time, avg_study = np.nanmean(_df[["解答時間(秒)", "学習投入時間(分)"]].to_numpy(dtype=np.float64), axis=0)
+    
+    # 学習データに含まれるユニークな科目・単元のペアを取得
+    unique_pairs = _df[["科目", "単元"]].drop_duplicates()
+    pair_subj = unique_pairs["科目"].astype(str).to_numpy()
+    pair_unit = unique_pairs["単元"].astype(str).to_numpy()
+    # エンコーダ未学習のラベルを1回のマスクで先に除外する（以降の辞書引きは必ず成功する）
+    known = np.isin(pair_subj, subj_classes) & np.isin(pair_unit, unit_classes)
+    unique_pairs = unique_pairs[known].reset_index(drop=True)
+    n_pairs = len(unique_pairs)
+    if n_pairs == 0:
+        return unique_pairs, None, np.full(n_future, np.nan), np.empty(0)
+    
+    # ラベル→コードの辞書で一括変換
+    subj_map = dict(zip(subj_classes, range(len(subj_classes))))
+    unit_map = dict(zip(unit_classes, range(len(unit_classes))))
+    s_codes = [subj_map[x] for x in pair_subj[known]]
+    u_codes = [unit_map[x] for x in pair_unit[known]]
+    
+    # 日数以外の特徴量（N×4）は共通なので一度だけ作り、日数列だけ差し替えて使う
+    base = np.column_stack([
+        s_codes, u_codes, np.full(n_pairs, avg_time), np.full(n_pairs, avg_study)
+    ])
+    # 指定日から30日分＋今日の計31日×全単元を1つの行列にまとめ、predict を1回で済ませる
+    # （行数がまとまるので、n_jobs=-1 のフォレストが木ごとの予測を全コアに振り分けられる）
+    days = np.append(np.arange(days_future, days_future + n_future), current_days)
+    X = np.empty((len(days) * n_pairs, 5), dtype=np.float32)
+    X[:, 0] = np.repeat(days, n_pairs)
+    X[:, 1:] = np.tile(base, (len(days), 1))
+    preds = model.predict(X).reshape(len(days), n_pairs)
+    
+    # 指定日の全単元平均は30日推移の初日と同じ
+    future_preds = preds[:n_future].mean(axis=1)
+    final_pred = float(future_preds[0])
+    p_all = preds[-1]
+    
+    return unique_pairs, final_pred, future_preds, p_all
+
+@st.cache_data(show_spinner=False)
+def make_pred_fig(dates, preds, target_rate, language):
+    """
+    30日間の予測推移グラフ（入力が同じなら同じFigureを再利用する）
+    """
+    fig = px.line(x=list(dates), y=list(preds),
+                  labels={"x": t("date"), "y": t("predicted_accuracy")}, title=t("30_day_growth_prediction"))
+    fig.add_hline(y=target_rate, line_dash="dash", line_color="red", annotation_text=t("goal"))
+    fig.update_layout(height=250, margin=dict(l=20, r=20, t=30, b=20))
+    return fig
+
+@st.cache_data(show_spinner=False)
+def make_importance_fig(importances, language):
+    """
+    変数重要度の横棒グラフ
+    """
+    fig = px.bar(importances, x="importance", y="feature", orientation="h",
+                 title=t("impact_on_accuracy"), labels={"importance": t("importance"), "feature": t("factor")})
+    fig.update_layout(height=200, margin=dict(l=20, r=20, t=30, b=20))
+    return fig
+
+@st.cache_data(ttl=3600, max_entries=16, show_spinner=False)
+def cached_weekly_study_plan(df_key, _df, exam_date, target_rate, current_rate, daily_study_time, language, today):
+    """
+    generate_weekly_study_plan のキャッシュ版（翻訳済みの単元名と今日起点の日付を含むため、言語と日付もキーに含める）
+    """
+    return generate_weekly_study_plan(_df, exam_date, target_rate, current_rate, daily_study_time)
+
+def generate_weekly_study_plan(df, exam_date, target_rate, current_rate, daily_study_time=60):
     """
     週間学習プラン自動生成 (エビングハウス忘却曲線 + 可用時間考慮)
     """
@@ -205,34 +409,36 @@ def generate_weekly_study_plan(df, exam_date, target_rate, current_rate):
     review_candidates = {} # date -> set(units)
     
     # 過去の学習ログから復習すべき単元を特定
-    df["date_obj"] = pd.to_datetime(df["日付"]).dt.date
-    
+    # （キャッシュ経由で呼ばれるため、引数の df には列を追加しない）
+    date_obj = df["日付"].dt.date
+    # 日付ごとのログ・学習単元、単元→科目の対応を一度だけ作り、以降は辞書引きにする
+    logs_by_date = {d: g for d, g in df.groupby(date_obj, sort=False)}
+    studied_by_date = df["単元"].groupby(date_obj, sort=False).unique().to_dict()
+    unit_to_subject = df.drop_duplicates("単元").set_index("単元")["科目"].to_dict()
+    
+    interval_deltas = [timedelta(days=interval) for interval in review_intervals]
     for day in range(min(7, days_left)):
         target_date = today + timedelta(days=day)
         review_units = set()
         
-        # この日(target_date)に復習すべき過去の日付を計算
-        for interval in review_intervals:
-            past_date = target_date - timedelta(days=interval)
-            # past_dateに学習した単元を取得
-            studied_on_date = df[df["date_obj"] == past_date]["単元"].unique()
-            for unit in studied_on_date:
-                review_units.add(unit)
+        # この日(target_date)に復習すべき過去の日付に学習した単元をまとめて取得
+        for delta in interval_deltas:
+            review_units.update(studied_by_date.get(target_date - delta, ()))
         
         review_candidates[target_date] = list(review_units)
 
     # 2. 弱点単元の抽出
-    weak_units = df.groupby("単元").agg({
-        "ミス": ["sum", "count"]
-    }).reset_index()
-    weak_units.columns = ["単元", "ミス数", "試行回数"]
-    weak_units["正答率"] = (weak_units["試行回数"] - weak_units["ミス数"]) / weak_units["試行回数"]
-    weak_units["優先度"] = (1 - weak_units["正答率"]) * weak_units["試行回数"]
-    weak_list = weak_units.sort_values("優先度", ascending=False)["単元"].tolist()
+    # 優先度 = (1 - 正答率) × 試行回数 はミス数そのものなので、単元別ミス数の降順で並べる
+    miss_by_unit = df.groupby("単元", observed=True)["ミス"].sum()
+    order = np.argsort(-miss_by_unit.to_numpy(), kind="stable")
+    weak_list = miss_by_unit.index[order].tolist()
+    # 単元の表示名・プラン種別のラベルは日ごとに引き直さず一度だけ翻訳する（単元が欠損の行は未翻訳のまま）
+    unit_tr = {u: dt(u) for u in set(df["単元"].unique()) | set(weak_list)}
+    type_labels = {k: t(k) for k in ("completed", "plan_review", "plan_weakness")}
     
     # 3. 週間プラン生成
     weekly_plan = {}
-    daily_limit_mins = st.session_state.get("daily_study_time", 60)
+    daily_limit_mins = daily_study_time
     unit_time_mins = 20 # 1単元あたりの想定時間
     
     # 過去7日 + 未来28日 (約1ヶ月)
@@ -244,22 +450,20 @@ def generate_weekly_study_plan(df, exam_date, target_rate, current_rate):
         date_str = date.strftime("%Y-%m-%d")
         
         todays_units = []
+        seen_names = set() # todays_units に入っている単元名（重複チェック用）
         current_time = 0
         
         if day < 0:
             # 過去: 学習ログから実績を表示
-            if not df.empty:
-                # date_objは既に作成済みと仮定、なければ作成
-                if "date_obj" not in df.columns:
-                    df["date_obj"] = pd.to_datetime(df["日付"]).dt.date
-                
-                day_logs = df[df["date_obj"] == date]
+            day_logs = logs_by_date.get(date)
+            if day_logs is not None:
                 for _, row in day_logs.iterrows():
                     # 重複排除（同じ単元を複数回やった場合など）
-                    if not any(u["name"] == dt(row["単元"]) for u in todays_units):
+                    if (name := unit_tr.get(row["単元"], row["単元"])) not in seen_names:
+                        seen_names.add(name)
                         todays_units.append({
-                            "name": dt(row["単元"]),
-                            "type": t("completed"), # "完了" or similar
+                            "name": name,
+                            "type": type_labels["completed"], # "完了" or similar
                             "subject": row["科目"]
                         })
                         current_time += row.get("学習投入時間(分)", 20) # データがなければ20分仮定
@@ -271,38 +475,29 @@ def generate_weekly_study_plan(df, exam_date, target_rate, current_rate):
             for unit in reviews:
                 if current_time + unit_time_mins <= daily_limit_mins:
                     # 科目を特定（dfから）
-                    subject = df[df["単元"] == unit]["科目"].iloc[0] if not df[df["単元"] == unit].empty else "復習"
-                    todays_units.append({"name": dt(unit), "type": t("plan_review"), "subject": subject})
+                    if (name := unit_tr.get(unit, unit)) in seen_names:
+                        continue
+                    seen_names.add(name)
+                    subject = unit_to_subject.get(unit, "復習")
+                    todays_units.append({"name": name, "type": type_labels["plan_review"], "subject": subject})
                     current_time += unit_time_mins
             
-            # B. 時間が余っていれば弱点単元を追加
-            weak_idx = 0
-            while current_time + unit_time_mins <= daily_limit_mins and weak_idx < len(weak_list):
-                unit = weak_list[weak_idx]
+            # B. 時間が余っていれば弱点単元を優先度順に追加（各単元は1日1回だけ見る）
+            remaining = deque(weak_list)
+            while remaining and current_time + unit_time_mins <= daily_limit_mins:
+                unit = remaining.popleft()
                 # まだリストになければ追加
-                if not any(u["name"] == dt(unit) for u in todays_units):
-                    subject = df[df["単元"] == unit]["科目"].iloc[0] if not df[df["単元"] == unit].empty else "弱点"
-                    todays_units.append({"name": dt(unit), "type": t("plan_weakness"), "subject": subject})
+                if (name := unit_tr[unit]) not in seen_names:
+                    seen_names.add(name)
+                    subject = unit_to_subject.get(unit, "弱点")
+                    todays_units.append({"name": name, "type": type_labels["plan_weakness"], "subject": subject})
                     current_time += unit_time_mins
-                weak_idx += 1
-                
-            # C. それでも時間が余っていれば、ランダムまたは次の弱点を追加
-            while current_time + unit_time_mins <= daily_limit_mins:
-                 if weak_idx < len(weak_list):
-                    unit = weak_list[weak_idx]
-                    if not any(u["name"] == dt(unit) for u in todays_units):
-                        subject = df[df["単元"] == unit]["科目"].iloc[0] if not df[df["単元"] == unit].empty else "演習"
-                        todays_units.append({"name": dt(unit), "type": t("study"), "subject": subject})
-                        current_time += unit_time_mins
-                    weak_idx += 1
-                 else:
-                     break 
             
             # D. 最低限の学習を保証 (時間が埋まってなくても、まだ何もなければ追加)
             if not todays_units and weak_list:
                 unit = weak_list[0]
-                subject = df[df["単元"] == unit]["科目"].iloc[0] if not df[df["単元"] == unit].empty else "演習"
-                todays_units.append({"name": dt(unit), "type": t("plan_weakness"), "subject": subject})
+                subject = unit_to_subject.get(unit, "演習")
+                todays_units.append({"name": unit_tr[unit], "type": type_labels["plan_weakness"], "subject": subject})
                 current_time += unit_time_mins
 
         if todays_units:
@@ -316,6 +511,74 @@ def generate_weekly_study_plan(df, exam_date, target_rate, current_rate):
 
     return weekly_plan
 
+# 復習ノート一覧の1ページあたりの表示件数
+NOTES_PAGE_SIZE = 20
+
+# 週間プランの単元カード用スタイル（科目ごとに色分け）
+PLAN_CARD_CSS = """
+<style>
+.plan-unit {
+    border-radius: 6px;
+    padding: 0.5rem;
+    min-height: 3.5rem;
+    display: flex;
+    align-items: center;
+    box-shadow: 0 1px 2px rgba(0,0,0,0.05);
+    width: 94%;
+    margin: 0 auto 0.25rem auto;
+    white-space: normal;
+    overflow-wrap: break-word;
+    line-height: 1.2;
+    font-size: 0.8rem;
+    font-weight: 700;
+}
+
+/* Language Style (Blue) */
+.plan-unit-lang {
+    background-color: #f0f9ff; /* sky-50 */
+    border: 1px solid #bae6fd; /* sky-200 */
+    border-left: 5px solid #0284c7; /* sky-600 */
+    color: #0c4a6e; /* sky-900 */
+}
+
+/* Non-Language Style (Orange) */
+.plan-unit-math {
+    background-color: #fff7ed; /* orange-50 */
+    border: 1px solid #fed7aa; /* orange-200 */
+    border-left: 5px solid #ea580c; /* orange-600 */
+    color: #7c2d12; /* orange-900 */
+}
+
+/* Other Style (Gray) */
+.plan-unit-other {
+    background-color: #f9fafb;
+    border: 1px solid #e5e7eb;
+    border-left: 5px solid #9ca3af;
+    color: #4b5563;
+}
+
+/* Completed units */
+.plan-unit-done {
+    opacity: 0.55;
+    text-decoration: line-through;
+}
+</style>
+"""
+
+@st.cache_data(show_spinner=False)
+def _day_card_html(day_str, is_today, weekday_label, primary_color):
+    """
+    週間プランの日付ヘッダーHTML（チェック状態に依存しない部分のみ）
+    """
+    bg_color = primary_color if is_today else "#f3f4f6"
+    text_color = "white" if is_today else "#4b5563"
+    month_day = datetime.strptime(day_str, "%Y-%m-%d").strftime('%m/%d')
+    return f"""
+    <div style="background:{bg_color}; color:{text_color}; padding:4px; border-radius:4px 4px 0 0; text-align:center; font-weight:bold; font-size:0.8rem; width: 94%; margin: 0 auto 12px auto;">
+        {weekday_label}<br><span style="font-size:0.7rem;">{month_day}</span>
+    </div>
+    """
+
 def generate_ai_advice(current_rate, target_rate, time_excess_rate, streak_days):
     """
     ルールベースAIによる学習アドバイス生成
@@ -352,6 +615,159 @@ def generate_ai_advice(current_rate, target_rate, time_excess_rate, streak_days)
     else:
         return f"**AIコーチ**: {main_icon} {main_text}"
 
+# 学習カレンダーのスタイル（呼び出しごとに組み立て直さない）
+_CALENDAR_CSS = """
+<style>
+.calendar-single {
+    background: white;
+    border-radius: 12px;
+    padding: 8px 12px;
+    box-shadow: 0 2px 8px rgba(0,0,0,0.08);
+    max-width: 100%;
+    margin: 0 auto;
+    font-family: "Source Sans Pro", sans-serif;
+}
+.calendar-header {
+    display: flex;
+    justify-content: space-between;
+    align-items: center;
+    margin-bottom: 20px;
+}
+.calendar-title {
+    font-size: 1.3rem;
+    font-weight: 800;
+    color: #1f2937;
+}
+.calendar-nav {
+    display: flex;
+    gap: 8px;
+}
+.calendar-nav-btn {
+    background: #f3f4f6;
+    border: none;
+    border-radius: 6px;
+    padding: 8px 12px;
+    cursor: pointer;
+    font-weight: 600;
+    color: #374151;
+    transition: all 0.2s;
+}
+.calendar-nav-btn:hover {
+    background: #e5e7eb;
+}
+.calendar-table {
+    width: 100%;
+    border-collapse: collapse;
+    table-layout: fixed;
+}
+.calendar-weekday {
+    font-size: 0.85rem;
+    font-weight: 700;
+    color: #6b7280;
+    text-align: center;
+    padding: 12px 8px;
+    border-bottom: 2px solid #e5e7eb;
+}
+.calendar-day {
+    aspect-ratio: 1;
+    text-align: center;
+    vertical-align: middle;
+    font-size: 0.9rem;
+    cursor: pointer;
+    position: relative;
+    border: 1px solid #f3f4f6;
+    padding: 4px;
+    box-sizing: border-box;
+}
+.calendar-day-content {
+    width: 100%;
+    height: 100%;
+    display: flex;
+    flex-direction: column;
+    align-items: center;
+    justify-content: center;
+    border-radius: 6px;
+    padding: 8px 4px;
+    box-sizing: border-box;
+    transition: all 0.2s;
+}
+.calendar-day-content:hover {
+    transform: translateY(-1px);
+    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+}
+.calendar-day-empty {
+    background: #fafafa;
+}
+.calendar-day-number {
+    font-weight: 600;
+    color: #1f2937;
+    font-size: 1rem;
+    line-height: 1;
+    margin-bottom: 4px;
+}
+.calendar-day-indicator {
+    font-size: 0.75rem;
+    margin-top: 2px;
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    gap: 2px;
+}
+/* 過去の学習データ（緑系） */
+.study-level-0 { background: #f9fafb; }
+.study-level-1 { background: #d1fae5; }
+.study-level-2 { background: #6ee7b7; }
+.study-level-3 { background: #34d399; }
+.study-level-4 { background: #10b981; color: white; }
+
+/* 未来の予定（青系） */
+.future-plan { 
+    background: #eff6ff; 
+    box-shadow: inset 0 0 0 2px #3b82f6;
+}
+.future-no-plan { background: #f9fafb; }
+
+/* 試験日（赤系） */
+.exam-date { 
+    background: linear-gradient(135deg, #fecaca 0%, #ef4444 100%);
+    box-shadow: inset 0 0 0 3px #dc2626;
+    color: white;
+    font-weight: 900;
+    position: relative;
+    overflow: hidden;
+}
+.exam-badge {
+    position: absolute;
+    top: 0;
+    right: 0;
+    background: #dc2626;
+    color: white;
+    font-size: 0.55rem;
+    padding: 1px 4px;
+    border-bottom-left-radius: 4px;
+    font-weight: 700;
+    line-height: 1.2;
+}
+</style>
+"""
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def cached_calendar_heatmap(df_key, _df, year, month, exam_date, weekly_plan, language, today):
+    """
+    generate_calendar_heatmap のキャッシュ版（翻訳済みの文言と「今日」の位置を含むため、言語と日付もキーに含める）
+    """
+    return generate_calendar_heatmap(_df, year, month, exam_date=exam_date, weekly_plan=weekly_plan)
+
+# カレンダーのセルHTML（固定部分は定数にして、セルごとは % で差し込むだけにする）
+_CAL_EMPTY_CELL = '<td class="calendar-day"><div class="calendar-day-content calendar-day-empty"></div></td>'
+_CAL_CELL_TEMPLATE = (
+    '<td class="calendar-day" title="%s"><div class="calendar-day-content %s">%s'
+    '<span class="calendar-day-number">%d</span><div class="calendar-day-indicator">%s</div></div></td>'
+)
+_CAL_EXAM_BADGE = '<span class="exam-badge">%s</span>'
+_CAL_DONE_INDICATOR = '<i class="bi bi-check-lg"></i>'
+_CAL_FUTURE_INDICATOR = '<i class="bi bi-pencil-fill" style="color:#3b82f6; font-size:0.7rem;"></i> <span style="color:#3b82f6;">%d</span>'
+
 def generate_calendar_heatmap(df, year, month, exam_date=None, weekly_plan=None):
     """
     学習カレンダーヒートマップを生成（強化版）
@@ -364,26 +780,38 @@ def generate_calendar_heatmap(df, year, month, exam_date=None, weekly_plan=None)
         import calendar as cal
         import pandas as pd # pandas import added for df_copy = pd.DataFrame()
         
-        # 日付列を確実にdatetime型に変換
+        # 日付列は取り込み時に datetime 化済み（NaT の行だけ除く）
         df_copy = df.copy() if not df.empty else pd.DataFrame()
         if not df_copy.empty:
-            df_copy["日付"] = pd.to_datetime(df_copy["日付"], errors='coerce')
             df_copy = df_copy.dropna(subset=["日付"])
             df_copy["日付"] = df_copy["日付"].dt.date
         
-        # 日別に集計
-        daily_stats_dict = {}
+        # 学習時間(分)による色レベルの境界（0分→0, 1-30→1, 31-60→2, 61-90→3, 91以上→4）
+        level_bins = np.array([0, 30, 60, 90])
+        level_classes = ["study-level-0", "study-level-1", "study-level-2", "study-level-3", "study-level-4"]
+        
+        # 日別に集計（表示月の日ごとの配列にする。添字は 日-1）
+        days_in_month = cal.monthrange(year, month)[1]
+        has_data = np.zeros(days_in_month, dtype=bool)
+        time_arr = np.zeros(days_in_month)
+        prob_arr = np.zeros(days_in_month, dtype=np.int64)
+        acc_arr = np.zeros(days_in_month)
         if not df_copy.empty:
-            daily_stats = df_copy.groupby(
-                "日付"
-            ).agg({
-                "問題ID": "count",
-                "正誤": lambda x: (x == "〇").mean(),
-                "学習投入時間(分)": "sum"
-            }).reset_index()
-            
-            daily_stats.columns = ["日付", "問題数", "正答率", "学習時間"]
-            daily_stats_dict = daily_stats.set_index("日付").to_dict('index')
+            # 取り込み時に作った正解フラグを組み込みの mean で集計する（lambda による Python 呼び出しを避ける）
+            daily_stats = df_copy.groupby("日付").agg(
+                問題数=("問題ID", "count"),
+                正答率=("_correct", "mean"),
+                学習時間=("学習投入時間(分)", "sum")
+            )
+            stat_dates = pd.DatetimeIndex(daily_stats.index)
+            in_month = (stat_dates.year == year) & (stat_dates.month == month)
+            pos = stat_dates.day.to_numpy()[in_month] - 1
+            has_data[pos] = True
+            time_arr[pos] = daily_stats["学習時間"].to_numpy()[in_month]
+            prob_arr[pos] = daily_stats["問題数"].to_numpy()[in_month]
+            acc_arr[pos] = daily_stats["正答率"].to_numpy()[in_month]
+        # 月全体の色レベルを一括で決める（right=True で「境界値以下」を同じレベルに含める）
+        levels = np.digitize(time_arr, level_bins, right=True)
         
         # 週間プランから未来の予定を取得
         future_plan_dict = {}
@@ -412,142 +840,6 @@ def generate_calendar_heatmap(df, year, month, exam_date=None, weekly_plan=None)
                     # エラーは無視して次へ
                     pass
         
-        # CSSを定義
-        css = """
-        <style>
-        .calendar-single {
-            background: white;
-            border-radius: 12px;
-            padding: 8px 12px;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.08);
-            max-width: 100%;
-            margin: 0 auto;
-            font-family: "Source Sans Pro", sans-serif;
-        }
-        .calendar-header {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            margin-bottom: 20px;
-        }
-        .calendar-title {
-            font-size: 1.3rem;
-            font-weight: 800;
-            color: #1f2937;
-        }
-        .calendar-nav {
-            display: flex;
-            gap: 8px;
-        }
-        .calendar-nav-btn {
-            background: #f3f4f6;
-            border: none;
-            border-radius: 6px;
-            padding: 8px 12px;
-            cursor: pointer;
-            font-weight: 600;
-            color: #374151;
-            transition: all 0.2s;
-        }
-        .calendar-nav-btn:hover {
-            background: #e5e7eb;
-        }
-        .calendar-table {
-            width: 100%;
-            border-collapse: collapse;
-            table-layout: fixed;
-        }
-        .calendar-weekday {
-            font-size: 0.85rem;
-            font-weight: 700;
-            color: #6b7280;
-            text-align: center;
-            padding: 12px 8px;
-            border-bottom: 2px solid #e5e7eb;
-        }
-        .calendar-day {
-            aspect-ratio: 1;
-            text-align: center;
-            vertical-align: middle;
-            font-size: 0.9rem;
-            cursor: pointer;
-            position: relative;
-            border: 1px solid #f3f4f6;
-            padding: 4px;
-            box-sizing: border-box;
-        }
-        .calendar-day-content {
-            width: 100%;
-            height: 100%;
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            justify-content: center;
-            border-radius: 6px;
-            padding: 8px 4px;
-            box-sizing: border-box;
-            transition: all 0.2s;
-        }
-        .calendar-day-content:hover {
-            transform: translateY(-1px);
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }
-        .calendar-day-empty {
-            background: #fafafa;
-        }
-        .calendar-day-number {
-            font-weight: 600;
-            color: #1f2937;
-            font-size: 1rem;
-            line-height: 1;
-            margin-bottom: 4px;
-        }
-        .calendar-day-indicator {
-            font-size: 0.75rem;
-            margin-top: 2px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            gap: 2px;
-        }
-        /* 過去の学習データ（緑系） */
-        .study-level-0 { background: #f9fafb; }
-        .study-level-1 { background: #d1fae5; }
-        .study-level-2 { background: #6ee7b7; }
-        .study-level-3 { background: #34d399; }
-        .study-level-4 { background: #10b981; color: white; }
-        
-        /* 未来の予定（青系） */
-        .future-plan { 
-            background: #eff6ff; 
-            box-shadow: inset 0 0 0 2px #3b82f6;
-        }
-        .future-no-plan { background: #f9fafb; }
-        
-        /* 試験日（赤系） */
-        .exam-date { 
-            background: linear-gradient(135deg, #fecaca 0%, #ef4444 100%);
-            box-shadow: inset 0 0 0 3px #dc2626;
-            color: white;
-            font-weight: 900;
-            position: relative;
-            overflow: hidden;
-        }
-        .exam-badge {
-            position: absolute;
-            top: 0;
-            right: 0;
-            background: #dc2626;
-            color: white;
-            font-size: 0.55rem;
-            padding: 1px 4px;
-            border-bottom-left-radius: 4px;
-            font-weight: 700;
-            line-height: 1.2;
-        }
-        </style>
-        """
-        
         # HTMLカレンダーを生成
         month_cal = cal.monthcalendar(year, month)
         if st.session_state.language == "English":
@@ -558,7 +850,18 @@ def generate_calendar_heatmap(df, year, month, exam_date=None, weekly_plan=None)
              
         today = datetime.today().date()
         
-        html = f'''
+        # セルごとに使う翻訳文字列は先に一度だけ引いておく
+        date_fmt = t("date_format")
+        exam_label = t("exam_date")
+        questions_unit = t("questions_unit")
+        accuracy_label = t("accuracy_rate")
+        minutes_unit = t("minutes_unit")
+        no_data_label = t("no_data")
+        plan_review_label = t("plan_review")
+        unit_label = t("unit")
+        no_change_label = t("no_change")
+        
+        parts = [f'''
         <div class="calendar-single">
             <div class="calendar-header">
                 <div class="calendar-title">{month_name}</div>
@@ -568,109 +871,82 @@ def generate_calendar_heatmap(df, year, month, exam_date=None, weekly_plan=None)
             </div>
             <table class="calendar-table">
                 <tr>
-        '''
+        ''']
         
         # 曜日ヘッダー
         weekdays = t("weekdays")
         for wd in weekdays:
-            html += f'<th class="calendar-weekday">{wd}</th>'
-        html += "</tr>"
+            parts.append(f'<th class="calendar-weekday">{wd}</th>')
+        parts.append("</tr>")
         
-        # 各週
+        # 各週（セルごとの断片をリストに溜めて最後に一度だけ連結する）
+        exam_badge = _CAL_EXAM_BADGE % exam_label
         for week in month_cal:
-            html += "<tr>"
+            parts.append("<tr>")
             for day in week:
                 if day == 0:
                     # 空白セル
-                    html += '<td class="calendar-day"><div class="calendar-day-content calendar-day-empty"></div></td>'
+                    parts.append(_CAL_EMPTY_CELL)
+                    continue
+                
+                date = datetime(year, month, day).date()
+                date_label = date.strftime(date_fmt)
+                indicator = ""
+                badge = ""
+                
+                if exam_date and date == exam_date:
+                    # 試験日
+                    css_class = "exam-date"
+                    tooltip = f"{date_label}: 🎯{exam_label}"
+                    badge = exam_badge
+                elif date <= today:
+                    # 過去/今日 - 学習データを表示
+                    if has_data[day - 1]:
+                        problems = int(prob_arr[day - 1])
+                        css_class = level_classes[levels[day - 1]]
+                        tooltip = f"{date_label}: {problems}{questions_unit}, {accuracy_label}{acc_arr[day - 1] * 100:.0f}%, {int(time_arr[day - 1])}{minutes_unit}"
+                        # 絵文字をBootstrap Iconに変更
+                        indicator = _CAL_DONE_INDICATOR if problems > 0 else ""
+                    else:
+                        css_class = "study-level-0"
+                        tooltip = f"{date_label}: {no_data_label}"
                 else:
-                    date = datetime(year, month, day).date()
-                    
-                    # 試験日かチェック
-                    is_exam_date = (exam_date and date == exam_date)
-                    
-                    # 過去 vs 未来
-                    is_past = date < today
-                    is_today = date == today
-                    is_future = date > today
-                    
-                    tooltip = ""
-                    css_class = ""
-                    indicator = ""
-                    badge = "" # Initialize badge
-                    
-                    if is_exam_date:
-                        # 試験日
-                        css_class = "exam-date"
-                        tooltip = f"{date.strftime(t('date_format'))}: 🎯{t('exam_date')}"
-                        badge = f'<span class="exam-badge">{t("exam_date")}</span>'
-                    elif is_past or is_today:
-                        # 過去/今日 - 学習データを表示
-                        if date in daily_stats_dict:
-                            study_time = daily_stats_dict[date]["学習時間"]
-                            problems = int(daily_stats_dict[date]["問題数"])
-                            accuracy = daily_stats_dict[date]["正答率"] * 100
-                            
-                            # 色レベルを決定
-                            if study_time == 0:
-                                level = 0
-                            elif study_time <= 30:
-                                level = 1
-                            elif study_time <= 60:
-                                level = 2
-                            elif study_time <= 90:
-                                level = 3
-                            else:
-                                level = 4
-                            
-                            css_class = f"study-level-{level}"
-                            tooltip = f"{date.strftime(t('date_format'))}: {problems}{t('questions_unit')}, {t('accuracy_rate')}{accuracy:.0f}%, {int(study_time)}{t('minutes_unit')}"
-                            # 絵文字をBootstrap Iconに変更
-                            indicator = '<i class="bi bi-check-lg"></i>' if problems > 0 else ""
-                        else:
-                            css_class = "study-level-0"
-                            tooltip = f"{date.strftime(t('date_format'))}: {t('no_data')}"
-                        badge = ""
+                    # 未来 - 週間プランを表示（日付をキーとして検索）
+                    plan_count = future_plan_dict.get(date, 0)
+                    if plan_count > 0:
+                        css_class = "future-plan"
+                        tooltip = f"{date_label}: 📝{plan_review_label} {plan_count}{unit_label}"
+                        indicator = _CAL_FUTURE_INDICATOR % plan_count
                     else:
-                        # 未来 - 週間プランを表示
-                        # 日付をキーとして検索
-                        plan_count = future_plan_dict.get(date, 0)
-                        
-                        if plan_count > 0:
-                            css_class = "future-plan"
-                            tooltip = f"{date.strftime(t('date_format'))}: 📝{t('plan_review')} {plan_count}{t('unit')}"
-                            # 絵文字をBootstrap Iconに変更
-                            indicator = f'<i class="bi bi-pencil-fill" style="color:#3b82f6; font-size:0.7rem;"></i> <span style="color:#3b82f6;">{plan_count}</span>'
-                        else:
-                            css_class = "future-no-plan"
-                            tooltip = f"{date.strftime(t('date_format'))}: {t('no_change')}"
-                        badge = ""
-                    
-                    html += f'''
-                    <td class="calendar-day" title="{tooltip}">
-                        <div class="calendar-day-content {css_class}">
-                            {badge}
-                            <span class="calendar-day-number">{day}</span>
-                            <div class="calendar-day-indicator">{indicator}</div>
-                        </div>
-                    </td>
-                    '''
+                        css_class = "future-no-plan"
+                        tooltip = f"{date_label}: {no_change_label}"
+                
+                parts.append(_CAL_CELL_TEMPLATE % (tooltip, css_class, badge, day, indicator))
             
-            html += "</tr>"
+            parts.append("</tr>")
         
-        html += '''
+        parts.append('''
             </table>
         </div>
-        '''
+        ''')
         
-        return css, html
+        return "".join(parts)
         
     except Exception as e:
         # st is globally imported
         st.error(f"カレンダーヒートマップの生成エラー: {e}")
         import traceback
         st.error(traceback.format_exc())
-        return None, None
+        return None
+
+def _score_units(miss, attempts, min_attempts=3, weak_threshold=0.5):
+    """
+    単元ごとの正答率と弱点判定をNumPy配列のまま一括計算
+    （min_attempts 問以上解いていて正答率が weak_threshold 未満なら弱点）
+    """
+    accuracy = np.divide(attempts - miss, attempts, out=np.zeros(len(attempts), dtype=np.float64), where=attempts > 0)
+    is_weak = (attempts >= min_attempts) & (accuracy < weak_threshold)
+    return accuracy, is_weak
 
 def generate_detailed_insights(df, current_rate, target_rate, exam_date=None):
     """
@@ -681,10 +957,14 @@ def generate_detailed_insights(df, current_rate, target_rate, exam_date=None):
     
     insights = []
     
+    # 日付（datetime化済み）と正解フラグは取り込み時のものを各分析で使い回す
+    ts = df["日付"] if "日付" in df.columns else None
+    is_correct = df["_correct"].to_numpy() if "_correct" in df.columns else None
+    
     # 1. 学習パターン分析（時間帯・曜日）
-    if "日付" in df.columns:
-        df["hour"] = pd.to_datetime(df["日付"]).dt.hour
-        df["dayofweek"] = pd.to_datetime(df["日付"]).dt.dayofweek
+    if ts is not None:
+        df["hour"] = ts.dt.hour
+        df["dayofweek"] = ts.dt.dayofweek
         
         # 時間帯別正答率
         hourly_stats = df.groupby("hour")["ミス"].agg(["sum", "count"])
@@ -704,16 +984,16 @@ def generate_detailed_insights(df, current_rate, target_rate, exam_date=None):
                 })
     
     # 2. 弱点の具体的指摘
-    unit_stats = df.groupby("単元")["ミス"].agg(["sum", "count"])
-    unit_stats["accuracy"] = (unit_stats["count"] - unit_stats["sum"]) / unit_stats["count"]
-    unit_stats = unit_stats[unit_stats["count"] >= 3]  # 3問以上のデータがある単元のみ
+    unit_stats = df.groupby("単元", observed=True)["ミス"].agg(["sum", "count"])
     
     if not unit_stats.empty:
-        weak_units = unit_stats[unit_stats["accuracy"] < 0.5].sort_values("accuracy")
+        accuracy, is_weak = _score_units(unit_stats["sum"].to_numpy(), unit_stats["count"].to_numpy())
         
-        if not weak_units.empty:
-            worst_unit = weak_units.index[0]
-            worst_accuracy = weak_units.iloc[0]["accuracy"]
+        if is_weak.any():
+            # 弱点単元のうち最も正答率が低いもの
+            worst_pos = np.flatnonzero(is_weak)[accuracy[is_weak].argmin()]
+            worst_unit = unit_stats.index[worst_pos]
+            worst_accuracy = accuracy[worst_pos]
             
             # 弱点単元へのアドバイス
             unit_advice = {
@@ -763,18 +1043,18 @@ def generate_detailed_insights(df, current_rate, target_rate, exam_date=None):
                 })
     
     # 4. 比較分析（直近1週間 vs 前週）
-    if "日付" in df.columns and len(df) >= 10:
-        df["date_obj"] = pd.to_datetime(df["日付"]).dt.date
+    if ts is not None and is_correct is not None and len(df) >= 10:
+        date_obj = ts.dt.date
         today = datetime.today().date()
         week_ago = today - timedelta(days=7)
         two_weeks_ago = today - timedelta(days=14)
         
-        this_week = df[df["date_obj"] >= week_ago]
-        last_week = df[(df["date_obj"] >= two_weeks_ago) & (df["date_obj"] < week_ago)]
+        this_week = (date_obj >= week_ago).to_numpy()
+        last_week = ((date_obj >= two_weeks_ago) & (date_obj < week_ago)).to_numpy()
         
-        if not this_week.empty and not last_week.empty:
-            this_week_rate = (this_week["正誤"] == "〇").sum() / len(this_week)
-            last_week_rate = (last_week["正誤"] == "〇").sum() / len(last_week)
+        if this_week.any() and last_week.any():
+            this_week_rate = is_correct[this_week].mean()
+            last_week_rate = is_correct[last_week].mean()
             improvement = this_week_rate - last_week_rate
             
             if improvement > 0.05:
@@ -839,25 +1119,33 @@ def generate_roadmap(exam_date, current_rate, target_rate):
     practice_days = int(days_left * (0.8 - base_ratio))
     final_days = days_left - base_days - practice_days
     
-    # データフレーム作成
-    data = [
-        dict(Task=t("timeline_foundation"), Start=today, Finish=today + timedelta(days=base_days), Phase="Foundation"),
-        dict(Task=t("timeline_applied"), Start=today + timedelta(days=base_days), Finish=today + timedelta(days=base_days + practice_days), Phase="Practice"),
-        dict(Task=t("timeline_final"), Start=today + timedelta(days=base_days + practice_days), Finish=exam_date, Phase="Final")
+    # 3行だけなので px.timeline（DataFrame整形・凡例推論）を通さず go.Bar を直接組む
+    # 日付軸の横棒は base=開始日、x=期間(ミリ秒) で表す（px.timeline と同じ表現）
+    practice_start = today + timedelta(days=base_days)
+    final_start = today + timedelta(days=base_days + practice_days)
+    phases = [
+        (t("timeline_foundation"), today, practice_start, "#60A5FA"),
+        (t("timeline_applied"), practice_start, final_start, "#34D399"),
+        (t("timeline_final"), final_start, exam_date, "#F87171"),
     ]
-    
-    df_gantt = pd.DataFrame(data)
-    
-    # Plotly Expressでガントチャート作成
-    fig = px.timeline(df_gantt, x_start="Start", x_end="Finish", y="Task", color="Phase",
-                      color_discrete_map={"Foundation": "#60A5FA", "Practice": "#34D399", "Final": "#F87171"},
-                      height=150) # 高さを抑える
+    labels, starts, finishes, colors = zip(*phases)
+    
+    fig = go.Figure(go.Bar(
+        y=labels,
+        x=[(f - s).days * 86400000 for s, f in zip(starts, finishes)],
+        base=[s.isoformat() for s in starts],
+        customdata=[f"{s:%m/%d} - {f:%m/%d}" for s, f in zip(starts, finishes)],
+        orientation="h",
+        marker_color=colors,
+        hovertemplate="%{y}<br>%{customdata}<extra></extra>",
+    ))
     
     fig.update_yaxes(autorange="reversed", title=None)
-    fig.update_xaxes(title=None, tickformat="%m/%d")
+    fig.update_xaxes(type="date", title=None, tickformat="%m/%d")
     
     # レイアウト調整
     fig.update_layout(
+        height=150, # 高さを抑える
         margin=dict(l=10, r=10, t=10, b=10),
         showlegend=False,
         plot_bgcolor="rgba(0,0,0,0)",
@@ -869,6 +1157,20 @@ def generate_roadmap(exam_date, current_rate, target_rate):
     return fig
 
 
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: _df_fingerprint})
+def _top_units_by_difficulty(df_master):
+    """
+    難易度ごとの主な単元（マスタの問題数が多い順トップ5）。マスタはほぼ静的なのでキャッシュする
+    """
+    # (難易度, 単元) ごとの件数を一度だけ数え、難易度内で件数の多い順に上位5件を取る
+    # （同数はマスタでの出現順。category 列でも未出現の単元は含めない）
+    counts = df_master.groupby(["難易度", "単元"], observed=True, sort=False).size()
+    top = counts.sort_values(ascending=False, kind="stable").groupby(level="難易度", observed=True, sort=False).head(5)
+    top_units = {}
+    for diff, unit in top.index:
+        top_units.setdefault(diff, []).append(unit)
+    return top_units
+
 def generate_study_roadmap_detailed(df, df_master):
     """
     難易度別学習ロードマップの生成
@@ -886,7 +1188,7 @@ def generate_study_roadmap_detailed(df, df_master):
     try:
         # DFとマスタをマージして難易度情報を取得
         if "難易度" in df.columns:
-            df_merged = df.copy()
+            df_merged = df
         else:
             df_merged = df.merge(df_master[["問題ID", "難易度", "科目", "単元"]], on="問題ID", how="left")
         
@@ -896,37 +1198,34 @@ def generate_study_roadmap_detailed(df, df_master):
         if df_merged.empty:
             return None, None, None
         
-        # 難易度別の統計を計算
+        if "_correct" not in df_merged.columns:
+            df_merged = df_merged.assign(_correct=(df_merged["正誤"].to_numpy() == "〇").astype(np.int8))
+        
+        # 難易度別の統計はログ・マスタそれぞれ一度の groupby でまとめて出し、難易度ごとに引くだけにする
+        log_stats = df_merged.groupby("難易度", observed=True).agg(
+            attempts=("問題ID", "size"),
+            correct=("_correct", "sum"),
+            solved=("問題ID", "nunique"),
+        )
+        master_totals = df_master["難易度"].value_counts()
+        master_units = _top_units_by_difficulty(df_master)
+        
         difficulty_stats = {}
         for diff in ["低", "中", "高"]:
-            diff_data = df_merged[df_merged["難易度"] == diff]
-            if not diff_data.empty:
-                total = len(diff_data)
-                correct = (diff_data["正誤"] == "〇").sum()
-                accuracy = correct / total if total > 0 else 0
-                
-                # マスタデータから該当難易度の総問題数を取得
-                master_diff = df_master[df_master["難易度"] == diff]
-                total_problems_in_master = len(master_diff)
-                coverage = (len(diff_data["問題ID"].unique()) / total_problems_in_master * 100) if total_problems_in_master > 0 else 0
-                
-                # その難易度の主な単元（問題数が多い順トップ5）
-                top_units = master_diff["単元"].value_counts().head(5).index.tolist()
-                
+            total_problems_in_master = int(master_totals.get(diff, 0))
+            top_units = master_units.get(diff, [])
+            if diff in log_stats.index:
+                attempts, correct, solved = (int(v) for v in log_stats.loc[diff, ["attempts", "correct", "solved"]])
                 difficulty_stats[diff] = {
-                    "solved": len(diff_data["問題ID"].unique()),
+                    "solved": solved,
                     "total": total_problems_in_master,
-                    "accuracy": accuracy,
-                    "coverage": coverage,
-                    "attempts": total,
+                    "accuracy": correct / attempts if attempts > 0 else 0,
+                    "coverage": (solved / total_problems_in_master * 100) if total_problems_in_master > 0 else 0,
+                    "attempts": attempts,
                     "units": top_units
                 }
             else:
                 # データがない場合
-                master_diff = df_master[df_master["難易度"] == diff]
-                total_problems_in_master = len(master_diff)
-                top_units = master_diff["単元"].value_counts().head(5).index.tolist()
-                
                 difficulty_stats[diff] = {
                     "solved": 0,
                     "total": total_problems_in_master,
@@ -936,6 +1235,9 @@ def generate_study_roadmap_detailed(df, df_master):
                     "units": top_units
                 }
         
+        # 未着手問題の判定用（一度だけ作って両分岐で使い回す）
+        solved_ids = set(df["問題ID"].to_numpy().tolist())
+        
         # 現在のフェーズを判定
         current_phase = "基礎固め"
         next_recommendations = []
@@ -955,7 +1257,7 @@ def generate_study_roadmap_detailed(df, df_master):
                 # 未着手の標準問題を推薦
                 unsolved_medium = df_master[
                     (df_master["難易度"] == "中") & 
-                    (~df_master["問題ID"].isin(df["問題ID"].unique()))
+                    (~df_master["問題ID"].isin(solved_ids))
                 ]
                 if not unsolved_medium.empty:
                     top_units = unsolved_medium["単元"].value_counts().head(3).index.tolist()
@@ -974,7 +1276,7 @@ def generate_study_roadmap_detailed(df, df_master):
             # 未着手の基礎問題を推薦
             unsolved_low = df_master[
                 (df_master["難易度"] == "低") & 
-                (~df_master["問題ID"].isin(df["問題ID"].unique()))
+                (~df_master["問題ID"].isin(solved_ids))
             ]
             if not unsolved_low.empty:
                 top_units = unsolved_low["単元"].value_counts().head(3).index.tolist()
@@ -1020,6 +1322,140 @@ def generate_study_roadmap_detailed(df, df_master):
         st.error(t("roadmap_error").format(e))
         return None, None, None
 
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: _df_fingerprint})
+def cached_roadmap(df_key, _df, df_master, language):
+    """
+    generate_study_roadmap_detailed のキャッシュ版
+    入力が変わらない再実行（画面遷移のみ等）では再計算しない。翻訳結果を含むため言語もキーに含める
+    """
+    return generate_study_roadmap_detailed(_df, df_master)
+
+# 科目別達成状況カードのHTMLテンプレート
+SUBJECT_CARD_TEMPLATE = '''
+<div style="text-align:center; margin-bottom:16px; cursor:pointer;">
+    <div style="font-size:0.9rem; color:#6B7280; margin-bottom:4px;">{subj_name}</div>
+    <div style="font-size:1.5rem; font-weight:700; color:{value_col}; line-height:1;">{r:.0%}</div>
+    <div style="font-size:0.75rem; color:{delta_col}; margin-bottom:8px;">{delta:+.0%}</div>
+    <div style="background-color:#E5E7EB; height:4px; border-radius:2px; width:100%; overflow:hidden;">
+        <div style="background-color:{value_col}; height:100%; width:{width}%;"></div>
+    </div>
+</div>
+'''
+
+# ロードマップのステータス別スタイル（翻訳キー -> (色, アイコン, 表示名キー)）
+ROADMAP_STATUS_STYLE = {
+    "status_completed": ("#10B981", "bi-check-circle-fill", "completed"),
+    "status_in_progress": ("#F59E0B", "bi-arrow-repeat", "in_progress"),
+    "default": ("#6B7280", "bi-pause-circle", "not_started"),  # Darker gray for better contrast
+}
+
+@st.cache_data(show_spinner=False)
+def _gauge_svg(current_pct, target_pct, color):
+    """
+    正答率の円形ゲージ（SVG）。整数の%と色だけで決まるのでキャッシュする
+    """
+    circumference = 2 * np.pi * 45
+    dash = (current_pct / 100.0) * circumference
+    remaining = circumference - dash
+    return f"""
+    <div class="metric-card" style="display:flex; align-items:center; justify-content:center; height:300px;">
+      <div class="flex flex-col items-center">
+        <div class="relative" style="width:160px; height:160px;">
+          <svg viewBox="0 0 100 100" style="transform: rotate(-90deg);">
+            <circle cx="50" cy="50" r="45" fill="none" stroke="var(--border)" stroke-width="8" />
+            <circle cx="50" cy="50" r="45" fill="none" stroke="{color}" stroke-width="8"
+                    stroke-dasharray="{dash:.2f} {remaining:.2f}" stroke-linecap="round" />
+          </svg>
+          <div style="position:absolute; inset:0; display:flex; flex-direction:column; align-items:center; justify-content:center;">
+            <span style="font-size:2rem; font-weight:800; color:var(--card-foreground);">{current_pct}%</span>
+            <span style="font-size:1rem; color:var(--muted-foreground);">/ {target_pct}%</span>
+          </div>
+        </div>
+      </div>
+    </div>
+    """
+
+@st.cache_data(show_spinner=False)
+def _next_steps_html(recs):
+    """
+    ロードマップの「次のステップ」リストHTML（推奨文はエスケープして埋め込む）
+    """
+    items = "".join(f'<li style="margin-bottom:8px;">{escape(r)}</li>' for r in recs)
+    return f'<ul style="margin:0; padding-left:20px; color:#475569;">{items}</ul>'
+
+@st.cache_data(show_spinner=False)
+def cached_roadmap_chart(exam_date, current_rate, target_rate, language):
+    """
+    generate_roadmap のキャッシュ版（翻訳済みラベルを含むため言語もキーに含める）
+    """
+    return generate_roadmap(exam_date, current_rate, target_rate)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _base_stats(df_key, _df):
+    """
+    科目×ジャンル×単元の基本集計（ヒートマップ・単元別集計はここから導出し、ログの走査は1回で済ませる）
+    """
+    return _df.groupby(["科目", "ジャンル", "単元"], observed=True, dropna=False).agg(
+        miss=("ミス", "sum"),
+        n=("ミス", "count"),
+        time_sum=("解答時間(秒)", "sum"),
+        time_n=("解答時間(秒)", "count"),
+    )
+
+def _accuracy(n, miss):
+    """
+    試行回数とミス数の配列から正答率を計算（試行0件は0）
+    """
+    n = n.to_numpy()
+    miss = miss.to_numpy()
+    return np.divide(n - miss, n, out=np.zeros(len(n), dtype=np.float64), where=n > 0)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _compute_heatmap(df_key, _df):
+    """
+    科目×ジャンルの正答率マトリクス（ヒートマップ用）
+    """
+    heatmap_data = _base_stats(df_key, _df).groupby(level=["科目", "ジャンル"], observed=True)[["miss", "n"]].sum().reset_index()
+    heatmap_data["正答率"] = _accuracy(heatmap_data["n"], heatmap_data["miss"])
+    return heatmap_data.pivot(index="ジャンル", columns="科目", values="正答率")
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _compute_unit_stats(df_key, _df):
+    """
+    単元ごとの平均解答時間・正答率（4象限分析用）
+    """
+    base = _base_stats(df_key, _df).reset_index()
+    unit_stats = base.groupby("単元", observed=True).agg(
+        time_sum=("time_sum", "sum"),
+        time_n=("time_n", "sum"),
+        ミス数=("miss", "sum"),
+        試行回数=("n", "sum"),
+        科目=("科目", "first"),
+    ).reset_index()
+    unit_stats.insert(1, "平均解答時間", unit_stats["time_sum"] / unit_stats["time_n"].where(unit_stats["time_n"] > 0))
+    unit_stats = unit_stats.drop(columns=["time_sum", "time_n"])
+    unit_stats["正答率"] = _accuracy(unit_stats["試行回数"], unit_stats["ミス数"])
+    return unit_stats
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _subject_unit_stats(df_key, _df):
+    """
+    科目×単元ごとの正答率（科目を選ぶたびにフィルタ＋集計し直さないよう一括で計算）
+    """
+    g = _base_stats(df_key, _df).groupby(level=["科目", "単元"], observed=True).agg(
+        sum=("miss", "sum"),
+        count=("n", "sum")
+    )
+    g["正答率"] = _accuracy(g["count"], g["sum"])
+    return g
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def cached_stacked_bar_chart(df_key, _df, language):
+    """
+    generate_stacked_bar_chart のキャッシュ版（翻訳済みラベルを含むため言語もキーに含める）
+    """
+    return generate_stacked_bar_chart(_df)
+
 def generate_stacked_bar_chart(df):
     """
     学習フローの積み上げ棒グラフ生成
@@ -1028,38 +1464,36 @@ def generate_stacked_bar_chart(df):
     if df.empty or len(df) < 5:
         return None
     
-    # データ準備
-    df_bar = df.copy()
-    df_bar["正誤ラベル"] = df_bar["正誤"].apply(lambda x: t("correct") if x == "〇" else t("incorrect"))
-    df_bar["単元ラベル"] = df_bar["単元"].apply(dt)
-    
-    # 集計: 単元・正誤ごとの件数
-    bar_data = df_bar.groupby(["単元ラベル", "正誤ラベル"]).size().reset_index(name="count")
-    
-    # 合計件数でソート（多い順）
-    total_counts = bar_data.groupby("単元ラベル")["count"].sum().sort_values(ascending=True)
-    bar_data["単元ラベル"] = pd.Categorical(bar_data["単元ラベル"], categories=total_counts.index, ordered=True)
-    bar_data = bar_data.sort_values("単元ラベル")
-    
-    # 積み上げ棒グラフ作成
-    fig = px.bar(
-        bar_data,
-        y="単元ラベル",
-        x="count",
-        color="正誤ラベル",
-        orientation='h',
-        color_discrete_map={
-            t("correct"): "rgba(16, 185, 129, 0.8)",   # Green with opacity
-            t("incorrect"): "rgba(239, 68, 68, 0.8)"   # Red with opacity
-        },
-        text="count"
-    )
-    
-    fig.update_traces(
-        textposition='inside', 
-        textfont_color='white',
-        hovertemplate='%{y}<br>%{data.name}: %{x}問<extra></extra>'
+    # 集計: 単元×正誤の件数表（コピーや行ごとの apply をせず groupby 一回で作る）
+    counts = (
+        df.groupby(["単元", "_correct"], observed=True).size()
+        .unstack(fill_value=0)
+        .reindex(columns=[1, 0], fill_value=0)
     )
+    # 合計件数でソート（多い順が上に来るよう昇順）
+    counts = counts.loc[counts.sum(axis=1).sort_values(kind="stable").index]
+    labels = [dt(u) for u in counts.index]
+    # 単元が多いときは棒内の数値ラベルを省き、描画コストを下げる（件数はホバーで確認できる）
+    show_text = len(counts) <= 30
+    
+    # 積み上げ棒グラフ作成（正解・不正解の2本を go.Bar で直接組む）
+    fig = go.Figure()
+    for flag, name, color in (
+        (1, t("correct"), "rgba(16, 185, 129, 0.8)"),     # Green with opacity
+        (0, t("incorrect"), "rgba(239, 68, 68, 0.8)"),    # Red with opacity
+    ):
+        values = counts[flag].to_numpy()
+        fig.add_trace(go.Bar(
+            y=labels,
+            x=values,
+            name=name,
+            orientation='h',
+            marker_color=color,
+            text=[v if v else "" for v in values.tolist()] if show_text else None,
+            textposition='inside',
+            textfont_color='white',
+            hovertemplate='%{y}<br>%{data.name}: %{x}問<extra></extra>'
+        ))
     
     fig.update_layout(
         title=dict(
@@ -1071,7 +1505,8 @@ def generate_stacked_bar_chart(df):
         xaxis_title=None, # Remove redundant title
         yaxis_title=None,
         barmode='stack',
-        height=max(400, len(total_counts) * 30), # Increase height per bar
+        uirevision="stacked_bar", # 再実行をまたいでズーム等の表示状態を保つ
+        height=max(400, len(counts) * 30), # Increase height per bar
         margin=dict(l=10, r=10, t=50, b=10),
         paper_bgcolor="rgba(0,0,0,0)",
         plot_bgcolor="rgba(0,0,0,0)",
@@ -1099,9 +1534,11 @@ def generate_weekly_report(df):
     today = datetime.today().date()
     week_ago = today - timedelta(days=7)
     
-    # 過去7日間のデータ
-    df["date_obj"] = pd.to_datetime(df["日付"]).dt.date
-    df_week = df[df["date_obj"] >= week_ago].copy()
+    # 過去7日間のデータ（元の df には列を足さず、必要な列だけを切り出す）
+    date_obj = df["日付"].dt.date
+    in_week = (date_obj >= week_ago).to_numpy()
+    week_cols = [c for c in ("単元", "ミス", "学習投入時間(分)") if c in df.columns]
+    df_week = df.loc[in_week, week_cols]
     
     if df_week.empty:
         return t("report_no_week_data")
@@ -1112,11 +1549,16 @@ def generate_weekly_report(df):
     accuracy = (1 - df_week["ミス"].mean()) * 100
     
     # 最も頑張った単元
-    top_unit = df_week.groupby("単元").size().idxmax() if not df_week.empty else "N/A"
-    top_count = df_week.groupby("単元").size().max() if not df_week.empty else 0
+    unit_counts = df_week.groupby("単元", observed=True).size()
+    if unit_counts.empty:
+        top_unit, top_count = "N/A", 0
+    else:
+        top_pos = unit_counts.to_numpy().argmax()
+        top_unit = unit_counts.index[top_pos]
+        top_count = int(unit_counts.iat[top_pos])
     
     # 継続日数
-    study_days = df_week["date_obj"].nunique()
+    study_days = date_obj[in_week].nunique()
     
     report = f"""
 ### <i class="bi bi-bar-chart-fill"></i> **{t("report_title").format(st.session_state.current_user)}**
@@ -1148,39 +1590,82 @@ def generate_weekly_report(df):
     
     return report
 
+def _predict_linear_trend(daily_accuracy, exam_date, periods):
+    """
+    データ日数が少ない場合の軽量予測（最小二乗の直線トレンド + 80%予測区間）
+    predict_with_prophet と同じ形式で結果を返す
+    """
+    ds = daily_accuracy["ds"]
+    origin = ds.min()
+    x = (ds - origin).dt.days.to_numpy(dtype=np.float64)
+    y = daily_accuracy["y"].to_numpy(dtype=np.float64)
+    n = len(x)
+    
+    slope, intercept = np.polyfit(x, y, 1)
+    resid = y - (slope * x + intercept)
+    s = np.sqrt((resid ** 2).sum() / (n - 2)) if n > 2 else 0.0
+    x_mean = x.mean()
+    sxx = ((x - x_mean) ** 2).sum()
+    
+    # 実績日 + 最終日以降 periods 日分（Prophet の make_future_dataframe と同じ範囲）
+    future_ds = pd.DatetimeIndex(ds).append(pd.date_range(ds.max() + timedelta(days=1), periods=periods, freq="D"))
+    xf = (future_ds - origin).days.to_numpy(dtype=np.float64)
+    yhat = slope * xf + intercept
+    margin = 1.2816 * s * np.sqrt(1 + 1 / n + (xf - x_mean) ** 2 / sxx) if sxx > 0 else np.zeros_like(xf)
+    
+    forecast_display = pd.DataFrame({
+        "日付": future_ds,
+        "予測正答率": yhat,
+        "下限": yhat - margin,
+        "上限": yhat + margin,
+    })
+    
+    exam_rows = forecast_display[forecast_display["日付"] == pd.Timestamp(exam_date)]
+    predicted_rate = exam_rows["予測正答率"].iat[0] if not exam_rows.empty else yhat[-1]
+    
+    return {
+        "forecast": forecast_display,
+        "predicted_rate": predicted_rate,
+        "model": None,
+        "actual_data": daily_accuracy
+    }, None
+
 def predict_with_prophet(df, target_rate, exam_date):
     """
     Prophet時系列予測 - より精密な正答率予測
     トレンド + 季節性を考慮した予測を提供
+    30日分未満のデータでは直線トレンドで代用する（Prophetの学習は重いため）
     """
-    try:
-        from prophet import Prophet
-    except ImportError:
-        return None, t("prophet_not_installed")
-    
     if df.empty or len(df) < 10:
         return None, t("prophet_min_data")
     
     if exam_date is None:
         return None, t("prophet_no_exam_date")
     
-    # データ準備
-    df_prophet = df.copy()
-    df_prophet["ds"] = pd.to_datetime(df_prophet["日付"])
-    
-    # 日別正答率を計算
-    daily_accuracy = df_prophet.groupby("ds").apply(
-        lambda x: (x["正誤"] == "〇").sum() / len(x)
-    ).reset_index()
-    daily_accuracy.columns = ["ds", "y"]
+    # 日別正答率を計算（日単位の datetime64[D] に落とし、np.unique + bincount の一回の走査で平均を出す）
+    days = df["日付"].to_numpy().astype("datetime64[D]")
+    valid = ~np.isnat(days)
+    uniq_days, inv = np.unique(days[valid], return_inverse=True)
+    y = np.bincount(inv, weights=df["_correct"].to_numpy()[valid]) / np.bincount(inv)
+    daily_accuracy = pd.DataFrame({"ds": uniq_days.astype("datetime64[ns]"), "y": y})
     
     if len(daily_accuracy) < 2:
         return None, "予測には最低2日分のデータが必要です"
     
+    periods = max((exam_date - datetime.today().date()).days, 0)
+    
+    if len(daily_accuracy) < 30:
+        return _predict_linear_trend(daily_accuracy, exam_date, periods)
+    
+    try:
+        from prophet import Prophet
+    except ImportError:
+        return None, t("prophet_not_installed")
+    
     # Prophetモデル構築
     model = Prophet(
         daily_seasonality=False,
-        weekly_seasonality=True if len(daily_accuracy) >= 7 else False,
+        weekly_seasonality=True,
         yearly_seasonality=False,
         interval_width=0.8  # 80%信頼区間
     )
@@ -1188,7 +1673,7 @@ def predict_with_prophet(df, target_rate, exam_date):
     model.fit(daily_accuracy)
     
     # 未来予測（試験日まで）
-    future_dates = model.make_future_dataframe(periods=(exam_date - datetime.today().date()).days)
+    future_dates = model.make_future_dataframe(periods=periods)
     forecast = model.predict(future_dates)
     
     # 試験日の予測値
@@ -1213,6 +1698,35 @@ def predict_with_prophet(df, target_rate, exam_date):
         "actual_data": daily_accuracy
     }, None
 
+@st.cache_resource(ttl=3600, show_spinner=False)
+def cached_prophet(df_key, _df, target_rate, exam_date, language):
+    """
+    predict_with_prophet のキャッシュ版（モデル学習は入力が変わった時だけ行う）
+    Prophetモデルを含むため pickle せずに cache_resource で保持する
+    """
+    return predict_with_prophet(_df, target_rate, exam_date)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def cached_weekly_report(df_key, _df, language):
+    """
+    generate_weekly_report のキャッシュ版（翻訳済みテキストのため言語もキーに含める）
+    """
+    return generate_weekly_report(_df)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def cached_pdf_report(report_text, user_name, df_key=None, _df=None):
+    """
+    generate_pdf_report のキャッシュ版（同じ週報・ユーザーならPDFバイト列を再利用）
+    """
+    return generate_pdf_report(report_text, user_name, _df)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def cached_excel_report(df_key, _df, user_name):
+    """
+    generate_excel_report のキャッシュ版
+    """
+    return generate_excel_report(_df, user_name)
+
 def generate_pdf_report(report_text, user_name, df=None):
     """
     週報レポートをPDF化（日本語対応・グラフ付き）
@@ -1221,7 +1735,6 @@ def generate_pdf_report(report_text, user_name, df=None):
         from fpdf import FPDF
         import io
         import matplotlib.pyplot as plt
-        import tempfile
         
         class PDF(FPDF):
             def header(self):
@@ -1256,34 +1769,36 @@ def generate_pdf_report(report_text, user_name, df=None):
         
         # --- グラフ生成と埋め込み ---
         if df is not None and not df.empty:
+            fig = None
             try:
-                # 科目別正答率グラフ
-                plt.figure(figsize=(6, 4))
-                subject_acc = df.groupby("科目")["ミス"].agg(["sum", "count"]).reset_index()
+                # 科目別正答率グラフ（pyplot の状態に頼らず figure/axes を明示して扱う）
+                fig, ax = plt.subplots(figsize=(6, 4))
+                subject_acc = df.groupby("科目", observed=True)["ミス"].agg(["sum", "count"]).reset_index()
                 subject_acc["accuracy"] = (subject_acc["count"] - subject_acc["sum"]) / subject_acc["count"]
                 
                 # 日本語フォント設定（matplotlib用）
                 # 環境によっては豆腐になるため、英語ラベルにするか、フォントパスを指定する
                 # ここでは簡易的に英語ラベルを使用
-                plt.bar(subject_acc["科目"], subject_acc["accuracy"], color="#3B82F6")
-                plt.title("Subject Accuracy")
-                plt.ylim(0, 1)
-                plt.ylabel("Accuracy")
+                ax.bar(subject_acc["科目"].astype(str), subject_acc["accuracy"], color="#3B82F6")
+                ax.set_title("Subject Accuracy")
+                ax.set_ylim(0, 1)
+                ax.set_ylabel("Accuracy")
                 
-                # 一時ファイルに保存
-                with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp_file:
-                    plt.savefig(tmp_file.name, format="png", dpi=100)
-                    tmp_path = tmp_file.name
+                # メモリ上のバッファに保存（一時ファイルの作成・削除をしない）
+                buf = io.BytesIO()
+                fig.savefig(buf, format="png", dpi=100)
+                buf.seek(0)
                 
-                # PDFに追加
-                pdf.image(tmp_path, x=10, y=30, w=100)
+                # PDFに追加（fpdf2 はファイルライクオブジェクトをそのまま受け取れる）
+                pdf.image(buf, x=10, y=30, w=100)
                 pdf.ln(80) # 画像分スペースを空ける
-                
-                # 後始末
-                os.remove(tmp_path)
             except Exception as e:
                 pdf.multi_cell(0, 5, f"[Graph Error: {e}]")
                 pdf.ln(5)
+            finally:
+                # 長寿命のStreamlitプロセスに figure が溜まらないよう必ず閉じる
+                if fig is not None:
+                    plt.close(fig)
 
         # レポート本文
         clean_text = report_text.replace("**", "").replace("###", "").replace("##", "").replace("*", "")
@@ -1317,73 +1832,54 @@ def generate_excel_report(df, user_name):
     """
     try:
         import io
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment
-        from openpyxl.utils.dataframe import dataframe_to_rows
+        import xlsxwriter  # noqa: F401  未インストールなら ImportError で None を返す
         
-        wb = Workbook()
-        
-        # シート1: 生データ
-        ws1 = wb.active
-        ws1.title = "学習ログ"
-        
-        # ヘッダースタイル
-        header_fill = PatternFill(start_color="3B82F6", end_color="3B82F6", fill_type="solid")
-        header_font = Font(color="FFFFFF", bold=True)
-        
-        # データフレームをExcelに書き込み
-        for r_idx, row in enumerate(dataframe_to_rows(df, index=False, header=True), 1):
-            for c_idx, value in enumerate(row, 1):
-                cell = ws1.cell(row=r_idx, column=c_idx, value=value)
-                if r_idx == 1:  # ヘッダー行
-                    cell.fill = header_fill
-                    cell.font = header_font
-                    cell.alignment = Alignment(horizontal="center")
-        
-        # 列幅自動調整
-        for column in ws1.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws1.column_dimensions[column_letter].width = adjusted_width
-        
-        # シート2: 統計サマリー
-        ws2 = wb.create_sheet("統計サマリー")
-        
-        if not df.empty:
-            # 基本統計
-            total_problems = len(df)
-            correct_count = (df["正誤"] == "〇").sum()
-            accuracy = correct_count / total_problems
+        excel_output = io.BytesIO()
+        # xlsxwriter は書き込み専用エンジンで、openpyxl のセル単位書き込みより速くメモリも小さい
+        with pd.ExcelWriter(excel_output, engine="xlsxwriter") as writer:
+            wb = writer.book
+            # ヘッダースタイル
+            header_fmt = wb.add_format({"bg_color": "#3B82F6", "font_color": "#FFFFFF", "bold": True, "align": "center"})
             
-            stats_data = [
-                ["指標", "値"],
-                ["総問題数", total_problems],
-                ["正解数", correct_count],
-                ["正答率", f"{accuracy:.1%}"],
-                ["平均解答時間", f"{df['解答時間(秒)'].mean():.1f}秒"],
-                ["総学習時間", f"{df['学習投入時間(分)'].sum():.0f}分"]
-            ]
+            # シート1: 生データ（内部用の正解フラグ列は出力しない）
+            log_df = df.drop(columns=["_correct"], errors="ignore")
+            # pandas 既定のヘッダー書式を避けるため、本体は2行目から書きヘッダーは自前で書く
+            log_df.to_excel(writer, sheet_name="学習ログ", index=False, header=False, startrow=1)
+            ws1 = writer.sheets["学習ログ"]
+            ws1.write_row(0, 0, [str(c) for c in log_df.columns], header_fmt)
+            
+            # 列幅自動調整（列ごとの最大文字数を .str.len() でまとめて求め、ヘッダー長と numpy で比較）
+            header_len = np.array([len(str(c)) for c in log_df.columns])
+            value_len = log_df.astype(str).apply(lambda c: c.str.len().max()).to_numpy() if not log_df.empty else 0
+            widths = np.minimum(np.maximum(header_len, value_len) + 2, 50)
+            for i, w in enumerate(widths.tolist()):
+                ws1.set_column(i, i, w)
             
-            for r_idx, row in enumerate(stats_data, 1):
-                for c_idx, value in enumerate(row, 1):
-                    cell = ws2.cell(row=r_idx, column=c_idx, value=value)
-                    if r_idx == 1:
-                        cell.fill = header_fill
-                        cell.font = header_font
+            # シート2: 統計サマリー
+            ws2 = wb.add_worksheet("統計サマリー")
             
-            ws2.column_dimensions['A'].width = 20
-            ws2.column_dimensions['B'].width = 15
+            if not df.empty:
+                # 基本統計
+                total_problems = len(df)
+                correct_count = int(df["_correct"].sum())
+                accuracy = correct_count / total_problems
+                
+                stats_data = [
+                    ["総問題数", total_problems],
+                    ["正解数", correct_count],
+                    ["正答率", f"{accuracy:.1%}"],
+                    ["平均解答時間", f"{df['解答時間(秒)'].mean():.1f}秒"],
+                    ["総学習時間", f"{df['学習投入時間(分)'].sum():.0f}分"]
+                ]
+                
+                ws2.write_row(0, 0, ["指標", "値"], header_fmt)
+                for r_idx, row in enumerate(stats_data, 1):
+                    ws2.write_row(r_idx, 0, row)
+                
+                ws2.set_column(0, 0, 20)
+                ws2.set_column(1, 1, 15)
         
         # バイナリデータとして返す
-        excel_output = io.BytesIO()
-        wb.save(excel_output)
         excel_output.seek(0)
         
         return excel_output
@@ -1559,7 +2055,20 @@ DEFAULT_MASTER_ROWS = [
     ["L-C01", "言語", "文章読解", "長文読解", 480, 70, "高", 5],
     ["L-C02", "言語", "文章読解", "論理的読解", 180, 65, "高", 4],
 ]
-df_master_default = pd.DataFrame(DEFAULT_MASTER_ROWS, columns=MASTER_COLUMNS)
+
+@st.cache_data(show_spinner=False)
+def get_default_master():
+    """
+    既定の問題マスタ（必要になった時に一度だけ作る）
+    数値列だけ値域に合う小さい整数型にする。文字列列は object のまま
+    （category にすると未出現カテゴリが value_counts やマージ後の集計に混ざるため。
+    マージ後のログは取り込み時に category 化している）
+    """
+    return pd.DataFrame(DEFAULT_MASTER_ROWS, columns=MASTER_COLUMNS).astype({
+        "目標解答時間(秒)": "int16",
+        "目標正答率(%)": "int8",
+        "出題頻度(重み)": "int8",
+    })
 
 # ===== セッション初期化 =====
 if "df_log_manual" not in st.session_state:
@@ -1593,7 +2102,7 @@ if "daily_study_time" not in st.session_state:
 if "plan_completion" not in st.session_state:
     st.session_state.plan_completion = {}
 if "df_notes" not in st.session_state:
-    st.session_state.df_notes = pd.DataFrame(columns=["問題ID", "メモ", "登録日時"])
+    set_notes(pd.DataFrame(columns=["問題ID", "メモ", "登録日時"]))
 if "display_mode" not in st.session_state:
     st.session_state.display_mode = "システム設定"
 
@@ -2302,7 +2811,8 @@ time_factor = {"標準": 1.0, "厳しく(-10%)": 0.9, "緩く(+10%)": 1.1}[st.se
 
 # マスタデータの準備（ファイル管理より先にデフォルト読み込み）
 if "df_master" not in st.session_state:
-    st.session_state.df_master = df_master_default.copy()
+    # cache_data は呼び出しごとにコピーを返すので、そのままセッションに置いてよい
+    st.session_state.df_master = get_default_master()
 
 # 2. 学習データ入力
 expanded_flag = st.session_state.get("expander_open", st.session_state.get("keep_input_open", True))
@@ -2358,7 +2868,7 @@ with st.sidebar.expander(t("input_data_title"), expanded=expanded_flag):
     col_t1, col_t2 = st.columns(2)
     with col_t1:
         def start_timer():
-            st.session_state.timer_start_time = time.time()
+            st.session_state.timer_start_time = time.monotonic()
             st.toast(t("timer_toast_start"), icon="⏱️")
 
         st.button(t("timer_start"), use_container_width=True, on_click=start_timer)
@@ -2366,7 +2876,7 @@ with st.sidebar.expander(t("input_data_title"), expanded=expanded_flag):
     with col_t2:
         def stop_timer():
             if st.session_state.get("timer_start_time"):
-                elapsed = int(time.time() - st.session_state.timer_start_time)
+                elapsed = int(time.monotonic() - st.session_state.timer_start_time)
                 st.session_state.timer_elapsed = elapsed
                 st.session_state.timer_start_time = None
                 st.toast(t("timer_toast_stop").format(elapsed), icon="✅")
@@ -2518,13 +3028,17 @@ if "df_log_manual" not in st.session_state or st.session_state.get("last_user")
 # ノートデータの取得
 @st.cache_data(ttl=60)
 def load_note_data(username):
-    return st.session_state.sheets_manager.load_notes(username)
-
-df_notes_result, note_err = load_note_data(st.session_state.current_user)
-if note_err:
-    st.session_state.df_notes = pd.DataFrame(columns=["問題ID", "メモ", "登録日時"])
-else:
-    st.session_state.df_notes = df_notes_result
+    notes, err = st.session_state.sheets_manager.load_notes(username)
+    # 読み込みごとの版数（キャッシュヒット中は同じ値）。変わった時だけセッションのノートを差し替える
+    return notes, err, time.time_ns()
+
+df_notes_result, note_err, notes_version = load_note_data(st.session_state.current_user)
+if st.session_state.get("df_notes_version") != notes_version:
+    st.session_state.df_notes_version = notes_version
+    if note_err:
+        set_notes(pd.DataFrame(columns=["問題ID", "メモ", "登録日時"]))
+    else:
+        set_notes(df_notes_result)
 
 # マスタデータ変数をローカル変数にセット（後続処理用）
 df_master = st.session_state.df_master
@@ -2544,17 +3058,30 @@ streak = 0
 prediction_text = t("data_insufficient")
 prediction_color = "#6B7280"
 prediction_sub = t("keep_studying")
-bd = pd.DataFrame(columns=["日", "正答率", "ミス", "count", "sum"]) # 初期化
+bd = pd.DataFrame(columns=["日", "正答率", "ミス", "count", "sum"]).astype({"日": "datetime64[ns]"}) # 初期化
 
 try:
     # データ処理
-    df_log["日付"] = pd.to_datetime(df_log["日付"], errors="coerce")
+    # 日付はここで一度だけ datetime 化し、以降の集計・グラフ関数では再変換しない
+    # （CSV/シート由来で書式が混在していても行ごとに解釈させる）
+    df_log["日付"] = pd.to_datetime(df_log["日付"], format="mixed", errors="coerce")
     df_log["解答時間(秒)"] = pd.to_numeric(df_log["解答時間(秒)"], errors="coerce").fillna(0)
     df_log["学習投入時間(分)"] = pd.to_numeric(df_log["学習投入時間(分)"], errors="coerce").fillna(0)
     df_log["ミス"] = (df_log["正誤"] == "✕").astype(int)
     df = pd.merge(df_log, df_master, on="問題ID", how="left")
     df["目標時間"] = df["目標解答時間(秒)"] * time_factor
     
+    # 低カーディナリティの文字列列は category、数値列は小さい型にしてメモリとgroupbyを軽くする
+    for c in ["科目", "ジャンル", "単元", "難易度"]:
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+    df["ミス"] = df["ミス"].astype(np.int8)
+    df["解答時間(秒)"] = df["解答時間(秒)"].astype(np.float32)
+    # 正解フラグ（1/0）は取り込み時に一度だけ作り、各集計・モデル学習で使い回す
+    df["_correct"] = (df["正誤"].to_numpy() == "〇").astype(np.int8)
+    # 正誤は「〇」「✕」程度しか値を取らないので category に（カテゴリは推定させ、表記ゆれの値も落とさない）
+    df["正誤"] = df["正誤"].astype("category")
+    
     # カレンダー用（全期間データ）
     df_all = df.copy()
 
@@ -2582,19 +3109,22 @@ try:
         te = df["時間超過"].mean()
         
         # 集計
-        agg = df.groupby("単元").agg({
-            "ミス": ["sum", "count"],
-            "解答時間(秒)": "mean",
-            "目標時間": "mean"
-        }).reset_index()
-        agg.columns = ["単元", "ミス数", "試行回数", "平均解答時間", "目標時間"]
-        agg["正答率"] = (agg["試行回数"] - agg["ミス数"]) / agg["試行回数"]
+        agg = df.groupby("単元", observed=True).agg(
+            ミス数=("ミス", "sum"),
+            試行回数=("ミス", "count"),
+            平均解答時間=("解答時間(秒)", "mean"),
+            目標時間=("目標時間", "mean")
+        ).reset_index()
+        agg["正答率"] = _accuracy(agg["試行回数"], agg["ミス数"])
         
         # 優先度スコア (正答率が低い & 試行回数が多い & 時間がかかる)
         agg["優先度"] = (1 - agg["正答率"]) * 2 + (agg["平均解答時間"] / agg["目標時間"] - 1).clip(0, 1)
+        # 優先度に応じた提案問題数 (例: 優先度1.0 -> 4問, 0.5 -> 2問、1〜5問)
+        # 目標解答時間が空のマスタだと優先度が NaN になるので、整数化の前に 0 で埋める（→最小の1問）
+        agg["q_count"] = np.clip(np.nan_to_num(agg["優先度"].to_numpy() * 4).astype(int), 1, 5).astype(np.int8)
         
         # 科目ごとの正答率
-        cr = df.groupby("科目")["ミス"].agg(["sum", "count"]).reset_index()
+        cr = df.groupby("科目", observed=True)["ミス"].agg(["sum", "count"]).reset_index()
         cr["正答率"] = (cr["count"] - cr["sum"]) / cr["count"]
         
         # 単元ごとの正答率をマージ
@@ -2602,12 +3132,11 @@ try:
         # 修正: 科目ごとの正答率は別途表示用。aggは単元別。
         agg = agg.sort_values("優先度", ascending=False)
         
-        cs = df.groupby("科目")["ミス"].agg(["sum", "count"]).reset_index()
+        cs = df.groupby("科目", observed=True)["ミス"].agg(["sum", "count"]).reset_index()
         cs["正答率"] = (cs["count"] - cs["sum"]) / cs["count"]
         
-        bd = df.copy()
-        bd["日"] = bd["日付"].dt.date
-        bd = bd.groupby("日")["ミス"].agg(["sum", "count"]).reset_index()
+        # 日付は datetime64 のまま日単位に丸めて集計（後段で再パースしない）
+        bd = df.groupby(df["日付"].dt.normalize().rename("日"))["ミス"].agg(["sum", "count"]).reset_index()
         bd["正答率"] = (bd["count"] - bd["sum"]) / bd["count"]
     else:
         agg = pd.DataFrame()
@@ -2653,7 +3182,7 @@ try:
 
     # 3. 推論マスター (推論ジャンルの正答率80%以上 & 5問以上)
     if not df.empty:
-        genre_stats = df.groupby("ジャンル")["ミス"].agg(["sum", "count"])
+        genre_stats = df.groupby("ジャンル", observed=True)["ミス"].agg(["sum", "count"])
         genre_stats["acc"] = (genre_stats["count"] - genre_stats["sum"]) / genre_stats["count"]
         for g_name, row in genre_stats.iterrows():
             if row["count"] >= 5 and row["acc"] >= 0.8:
@@ -2679,6 +3208,11 @@ try:
 except Exception as e:
     st.error(f"{t('data_processing_error')}: {e}")
 
+# キャッシュキー用の内容指紋は取り込み・期間絞り込み・列追加がすべて終わったここで一度だけ計算し、
+# 各キャッシュ関数には (df_key, _df) として渡す（関数ごとに全セルをハッシュし直さない）
+df_key = _df_fingerprint(df)
+df_all_key = _df_fingerprint(df_all)
+
 
 # ===== ヘッダー (Data Loaded) =====
 title_text = t("app_title")
@@ -2775,13 +3309,13 @@ if not df.empty:
     ac1, ac2 = st.columns(2)
 
     with ac1:
-        tu = agg.iloc[0] if not agg.empty else None
-        if tu is not None:
-            top_unit_accuracy = tu["正答率"]
-            tc = cau.iloc[0][t("cause")] if not cau.empty else t("unknown")
+        if not agg.empty:
+            # 先頭行はSeriesを作らずスカラーで直接取得
+            top_unit_accuracy = agg["正答率"].iat[0]
+            tc = cau[t("cause")].iat[0] if not cau.empty else t("unknown")
             rsn = f"{t('accuracy_rate')}{top_unit_accuracy:.0%}。" + (t("time_shortage_issue") if te > 0.3 else f"「{tc}」{t('main_cause_review_field')}")
             
-            unit_name = tu['単元']
+            unit_name = agg["単元"].iat[0]
             
             st.markdown(f"""
 <div class="action-card" style="height: 100%;">
@@ -2814,13 +3348,12 @@ if not df.empty:
         
         if not agg.empty:
             top_3 = agg.head(3)
-            for i, row in top_3.iterrows():
-                # 優先度に応じて問題数を提案 (例: 優先度1.0 -> 3問, 0.5 -> 2問)
-                q_count = max(1, min(5, int(row["優先度"] * 4)))
+            for row in top_3.itertuples():
+                # 問題数は集計時に算出済み (agg["q_count"])
                 st.markdown(f"""
                 <div style="display:flex; justify-content:space-between; align-items:center; margin-bottom:8px; border-bottom:1px dashed #e5e7eb; padding-bottom:4px;">
-                    <span style="font-weight:700; color:#374151;">{i+1}. {dt(row['単元'])}</span>
-                    <span style="font-weight:800; color:{PRIMARY};">{q_count}{t('questions_unit')}</span>
+                    <span style="font-weight:700; color:#374151;">{row.Index+1}. {dt(row.単元)}</span>
+                    <span style="font-weight:800; color:{PRIMARY};">{row.q_count}{t('questions_unit')}</span>
                 </div>
                 """, unsafe_allow_html=True)
         else:
@@ -2888,6 +3421,19 @@ tab_selection = sac.tabs([
 
 
 if tab_selection == t("tab_dashboard"):
+    # 再実行ごとに現在時刻を1回だけ取得して使い回す
+    NOW = datetime.now()
+    TODAY = NOW.date()
+    TODAY_STR = NOW.strftime('%Y-%m-%d')
+    
+    # グラフ・表で繰り返し使う翻訳ラベル
+    _T_ACC = t("accuracy_rate")
+    _T_COUNT = t("count")
+    _T_CAUSE = t("cause")
+    _T_SUBJECT = t("subject")
+    _T_UNIT = t("unit")
+    _T_DATE = t("date")
+
     if df_all.empty:
         sac.alert(t("sidebar_input_prompt"), icon='info-circle', color='info')
     else:
@@ -2977,9 +3523,9 @@ if tab_selection == t("tab_dashboard"):
             with st.expander(t("study_calendar"), expanded=True):
                 # セッションステートで表示月を管理
                 if "calendar_year" not in st.session_state:
-                    st.session_state.calendar_year = datetime.now().year
+                    st.session_state.calendar_year = TODAY.year
                 if "calendar_month" not in st.session_state:
-                    st.session_state.calendar_month = datetime.now().month
+                    st.session_state.calendar_month = TODAY.month
                 
                 # 月間ナビゲーション
                 c_nav1, c_nav2, c_nav3 = st.columns([1, 5, 1])
@@ -3007,29 +3553,35 @@ if tab_selection == t("tab_dashboard"):
                 # 週間プランからカレンダー用のデータを生成
                 weekly_plan_for_calendar = {}
                 if st.session_state.exam_date:
-                    weekly_plan_data = generate_weekly_study_plan(
+                    weekly_plan_data = cached_weekly_study_plan(
+                        df_all_key,
                         df_all, 
                         st.session_state.exam_date, 
                         tgt_r, 
-                        cor_r
+                        cor_r,
+                        st.session_state.get("daily_study_time", 60),
+                        st.session_state.language,
+                        TODAY
                     )
                     if weekly_plan_data:
                         weekly_plan_for_calendar = weekly_plan_data
                 
                 # カレンダー表示
-                result = generate_calendar_heatmap(
+                result = cached_calendar_heatmap(
+                    df_all_key,
                     df_all,
                     st.session_state.calendar_year,
                     st.session_state.calendar_month,
-                    exam_date=st.session_state.exam_date,
-                    weekly_plan=weekly_plan_for_calendar
+                    st.session_state.exam_date,
+                    weekly_plan_for_calendar,
+                    st.session_state.language,
+                    TODAY
                 )
             
-                if result and result[0] and result[1]:
-                    css, html = result
-                    full_html = css + html
-                    import streamlit.components.v1 as components
-                    components.html(full_html, height=400, scrolling=False)
+                if result:
+                    # components.html は iframe 内に描画されるため、ページ側に一度だけ
+                    # CSS を流しても効かない。定数の CSS をここで前置し、キャッシュには HTML だけを持つ
+                    components.html(_CALENDAR_CSS + result, height=400, scrolling=False)
                     st.markdown("<div style='margin-top: -80px;'></div>", unsafe_allow_html=True)
 
         # 設定された順序でウィジェットを表示
@@ -3044,6 +3596,7 @@ if tab_selection == t("tab_dashboard"):
         # 全てのコンポーネントを関数化してリスト順に呼び出すのがベストです。
         
         # 残りのコンポーネントの関数化（インラインで定義）
+        @st.fragment
         def render_weekly_plan():
             if st.session_state.exam_date:
                 sac.divider(label=t('weekly_learning_plan'), icon='calendar-week', align='left')
@@ -3057,11 +3610,15 @@ if tab_selection == t("tab_dashboard"):
                 # Use global df_all if available
                 target_df = df_all if 'df_all' in globals() and not df_all.empty else pd.DataFrame()
                 
-                plan_data = generate_weekly_study_plan(
+                plan_data = cached_weekly_study_plan(
+                    df_all_key if target_df is df_all else _df_fingerprint(target_df),
                     target_df, 
                     st.session_state.exam_date, 
                     st.session_state.target_rate_user / 100, 
-                    0
+                    0,
+                    st.session_state.get("daily_study_time", 60),
+                    st.session_state.language,
+                    TODAY
                 )
                 
                 if plan_data:
@@ -3071,7 +3628,7 @@ if tab_selection == t("tab_dashboard"):
                     DAYS_PER_PAGE = 7
                     
                     # Find today's index
-                    today_str = datetime.now().strftime('%Y-%m-%d')
+                    today_str = TODAY_STR
                     today_idx = 0
                     for i, (d_str, _) in enumerate(plan_items):
                         if d_str == today_str:
@@ -3096,24 +3653,30 @@ if tab_selection == t("tab_dashboard"):
                         if start_idx > 0:
                             if st.button("← " + t("prev_week"), key="plan_prev_btn"):
                                 st.session_state.plan_page_idx -= 1
-                                trigger_rerun()
+                                # ページ送りは週間プラン部分だけ再描画する
+                                st.rerun(scope="fragment")
                     with c_next:
                         if end_idx < total_days:
                             if st.button(t("next_week") + " →", key="plan_next_btn"):
                                 st.session_state.plan_page_idx += 1
-                                trigger_rerun()
+                                # ページ送りは週間プラン部分だけ再描画する
+                                st.rerun(scope="fragment")
                     
                     # 週間プラン表示コンテナ（CSSで横スクロール制御）
                     st.markdown('<div class="weekly-plan-container">', unsafe_allow_html=True)
                     
-                    current_items = plan_items[start_idx:end_idx]
-                    cols = st.columns(len(current_items))
-
                     # Display Items
                     current_items = plan_items[start_idx:end_idx]
                     cols = st.columns(len(current_items))
                     
                     weekdays = [t("mon"), t("tue"), t("wed"), t("thu"), t("fri"), t("sat"), t("sun")]
+                    
+                    # 単元カードのスタイル（全カラム共通なので1回だけ出力）
+                    st.markdown(PLAN_CARD_CSS, unsafe_allow_html=True)
+                    
+                    # 単元ごとに変わらない値はループの外で1回だけ作る（デフォルト時間は例: 20:00）
+                    default_sch_time = datetime.strptime("20:00", "%H:%M").time()
+                    plan_rows = []
 
                     for i, col in enumerate(cols):
                         date_str, plan = current_items[i]
@@ -3122,181 +3685,93 @@ if tab_selection == t("tab_dashboard"):
                         
                         with col:
                             # Header with increased margin (12px)
-                            bg_color = PRIMARY if is_today else "#f3f4f6"
-                            text_color = "white" if is_today else "#4b5563"
                             wd = weekdays[day_date.weekday()]
+                            st.markdown(_day_card_html(date_str, is_today, wd, PRIMARY), unsafe_allow_html=True)
                             
-                            st.markdown(f"""
-                            <div style="background:{bg_color}; color:{text_color}; padding:4px; border-radius:4px 4px 0 0; text-align:center; font-weight:bold; font-size:0.8rem; width: 94%; margin: 0 auto 12px auto;">
-                                {wd}<br><span style="font-size:0.7rem;">{day_date.strftime('%m/%d')}</span>
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            # Content
+                            # Content: 単元カードは表示のみ（操作は下の表にまとめる）
                             units = plan.get('units', [])
-                            
-                            # カード風コンテナ
-                            with st.container():
-                                # CSS: Sibling selector approach
-                                st.markdown(f"""
-                                <style>
-                                /* Reduce gap in the vertical block containing plan markers */
-                                div[data-testid="stVerticalBlock"]:has(span.plan-marker-lang),
-                                div[data-testid="stVerticalBlock"]:has(span.plan-marker-math),
-                                div[data-testid="stVerticalBlock"]:has(span.plan-marker-other) {{
-                                    gap: 0.25rem !important;
-                                }}
-
-                                /* Hide the marker containers so they don't take up space/gaps */
-                                div[data-testid="element-container"]:has(span.plan-marker-lang),
-                                div[data-testid="element-container"]:has(span.plan-marker-math),
-                                div[data-testid="element-container"]:has(span.plan-marker-other) {{
-                                    display: none !important;
-                                }}
-
-                                /* Language Style (Blue) */
-                                div[data-testid="stVerticalBlock"] > div:has(span.plan-marker-lang) + div button {{
-                                    background-color: #f0f9ff !important; /* sky-50 */
-                                    border: 1px solid #bae6fd !important; /* sky-200 */
-                                    border-left: 5px solid #0284c7 !important; /* sky-600 */
-                                    color: #0c4a6e !important; /* sky-900 */
-                                    border-radius: 6px !important;
-                                    padding: 0.25rem 0.5rem !important;
-                                    min-height: 3.5rem !important;
-                                    height: auto !important;
-                                    display: flex !important;
-                                    align-items: center !important;
-                                    justify-content: flex-start !important;
-                                    box-shadow: 0 1px 2px rgba(0,0,0,0.05);
-                                    transition: all 0.2s ease;
-                                    width: 94% !important;
-                                    margin: 0 auto !important;
-                                }}
-                                div[data-testid="stVerticalBlock"] > div:has(span.plan-marker-lang) + div button:hover {{
-                                    background-color: #e0f2fe !important; /* sky-100 */
-                                    transform: translateY(-1px);
-                                    box-shadow: 0 4px 6px rgba(0,0,0,0.08);
-                                }}
-                                div[data-testid="stVerticalBlock"] > div:has(span.plan-marker-lang) + div button span[data-testid="stIconMaterial"] {{
-                                    color: #0284c7 !important; /* sky-600 */
-                                }}
-
-                                /* Non-Language Style (Orange) */
-                                div[data-testid="stVerticalBlock"] > div:has(span.plan-marker-math) + div button {{
-                                    background-color: #fff7ed !important; /* orange-50 */
-                                    border: 1px solid #fed7aa !important; /* orange-200 */
-                                    border-left: 5px solid #ea580c !important; /* orange-600 */
-                                    color: #7c2d12 !important; /* orange-900 */
-                                    border-radius: 6px !important;
-                                    padding: 0.25rem 0.5rem !important;
-                                    min-height: 3.5rem !important;
-                                    height: auto !important;
-                                    display: flex !important;
-                                    align-items: center !important;
-                                    justify-content: flex-start !important;
-                                    box-shadow: 0 1px 2px rgba(0,0,0,0.05);
-                                    transition: all 0.2s ease;
-                                    width: 94% !important;
-                                    margin: 0 auto !important;
-                                }}
-                                div[data-testid="stVerticalBlock"] > div:has(span.plan-marker-math) + div button:hover {{
-                                    background-color: #ffedd5 !important; /* orange-100 */
-                                    transform: translateY(-1px);
-                                    box-shadow: 0 4px 6px rgba(0,0,0,0.08);
-                                }}
-                                div[data-testid="stVerticalBlock"] > div:has(span.plan-marker-math) + div button span[data-testid="stIconMaterial"] {{
-                                    color: #ea580c !important; /* orange-600 */
-                                }}
-
-                                /* Other Style (Gray) */
-                                div[data-testid="stVerticalBlock"] > div:has(span.plan-marker-other) + div button {{
-                                    background-color: #f9fafb !important;
-                                    border: 1px solid #e5e7eb !important;
-                                    border-left: 5px solid #9ca3af !important;
-                                    color: #4b5563 !important;
-                                    border-radius: 6px !important;
-                                    padding: 0.25rem 0.5rem !important;
-                                    min-height: 3.5rem !important;
-                                    height: auto !important;
-                                    display: flex !important;
-                                    align-items: center !important;
-                                    justify-content: flex-start !important;
-                                    box-shadow: 0 1px 2px rgba(0,0,0,0.05);
-                                    width: 94% !important;
-                                    margin: 0 auto !important;
-                                }}
+                            unit_cards = []
+                            for unit in units:
+                                unit_name = unit['name']
+                                unit_subj = unit.get('subject', '学習')
+                                done_key = f"plan_{date_str}_{unit_name}"
+                                done = st.session_state.plan_completion.get(done_key, False)
                                 
-                                /* Text Wrapping Fix */
-                                div[data-testid="stVerticalBlock"] button p {{
-                                    white-space: normal !important;
-                                    overflow-wrap: break-word !important;
-                                    text-align: left !important;
-                                    line-height: 1.2 !important;
-                                    font-size: 0.8rem !important;
-                                    font-weight: 700 !important;
-                                    margin: 0 !important;
-                                    flex-grow: 1 !important;
-                                }}
-                                </style>
-                                """, unsafe_allow_html=True)
+                                # マーカークラスの決定
+                                if unit_subj in ["言語", "英語"]:
+                                    marker_class = "plan-unit-lang"
+                                elif unit_subj in ["非言語", "構造的把握"]:
+                                    marker_class = "plan-unit-math"
+                                else:
+                                    marker_class = "plan-unit-other"
                                 
-                                for idx, unit in enumerate(units):
-                                    unit_name = unit['name']
-                                    unit_subj = unit.get('subject', '学習')
-                                    unit_type = unit.get('type', '')
-                                    
-                                    # マーカークラスの決定
-                                    if unit_subj in ["言語", "英語"]:
-                                        marker_class = "plan-marker-lang"
-                                    elif unit_subj in ["非言語", "構造的把握"]:
-                                        marker_class = "plan-marker-math"
-                                    else:
-                                        marker_class = "plan-marker-other"
-                                    
-                                    # カレンダー追加ポップオーバー（単元名をクリックして開く）
-                                    pop_key = f"cal_{date_str}_{idx}"
-                                    try:
-                                        # マーカーを注入 (非表示)
-                                        st.markdown(f'<span class="{marker_class}" style="display:none;"></span>', unsafe_allow_html=True)
-                                        
-                                        # ラベル: 単元名のみ
-                                        btn_label = f"{unit_name}"
-                                        
-                                        with st.popover(btn_label, icon=":material/event:", use_container_width=True, help=f"{unit_subj}: {t('add_to_google_calendar')}"):
-                                            st.markdown(f"**{unit_name}**")
-                                            st.caption(f"{t('subject')}: {unit_subj} | {t('type')}: {unit_type}")
+                                unit_cards.append(
+                                    f'<div class="plan-unit {marker_class}{" plan-unit-done" if done else ""}" title="{escape(unit_subj)}">{escape(unit_name)}</div>'
+                                )
+                                plan_rows.append({
+                                    "done": done,
+                                    "date": date_str,
+                                    "subject": unit_subj,
+                                    "unit": unit_name,
+                                    "type": unit.get('type', ''),
+                                })
+                            
+                            st.markdown("".join(unit_cards), unsafe_allow_html=True)
+                            st.caption(f"Total: {plan['time_minutes']}{t('minutes')}")
+                    
+                    # 完了チェックは1つの表で編集する（単元ごとのウィジェットを作らない）
+                    if plan_rows:
+                        plan_df = pd.DataFrame(plan_rows)
+                        edited_plan = st.data_editor(
+                            plan_df,
+                            column_config={
+                                "done": st.column_config.CheckboxColumn(t("plan_done")),
+                                "date": st.column_config.TextColumn(_T_DATE, disabled=True),
+                                "subject": st.column_config.TextColumn(_T_SUBJECT, disabled=True),
+                                "unit": st.column_config.TextColumn(_T_UNIT, disabled=True),
+                                "type": st.column_config.TextColumn(t("type"), disabled=True),
+                            },
+                            hide_index=True,
+                            use_container_width=True,
+                            key=f"plan_editor_{st.session_state.plan_page_idx}",
+                        )
+                        
+                        # 完了状態はまとめて反映し、変化があれば単元カードも描き直す
+                        if not edited_plan["done"].equals(plan_df["done"]):
+                            done_keys = "plan_" + edited_plan["date"] + "_" + edited_plan["unit"]
+                            st.session_state.plan_completion.update(dict(zip(done_keys, edited_plan["done"])))
+                            st.rerun(scope="fragment")
+                        
+                        # カレンダー登録は1つのポップオーバーにまとめ、選んだ単元を同じ時間帯で一括登録する
+                        # 選択肢は行位置ではなく「plan_{日付}_{単元}」で持ち、週を送っても別の単元を指さないようにする
+                        plan_keys = ("plan_" + plan_df["date"] + "_" + plan_df["unit"]).tolist()
+                        unit_labels = dict(zip(plan_keys, (plan_df["date"].str[5:].str.replace("-", "/") + " " + plan_df["unit"]).tolist()))
+                        with st.popover(t("register_selected"), icon=":material/event:", use_container_width=True):
+                            picked = st.multiselect(_T_UNIT, options=plan_keys, format_func=unit_labels.__getitem__, key=f"plan_register_units_{st.session_state.plan_page_idx}")
+                            sch_time = st.time_input(t("start_time"), value=default_sch_time, key="plan_register_time")
+                            sch_dur = st.number_input(t("study_duration_min"), value=20, step=10, key="plan_register_dur")
+                            
+                            if st.button(t("register"), key="plan_register_btn", type="primary", disabled=not picked):
+                                service, error = get_calendar_service()
+                                if error:
+                                    st.error(error)
+                                else:
+                                    picked_set = set(picked)
+                                    for row in plan_df[[k in picked_set for k in plan_keys]].itertuples(index=False):
+                                        try:
+                                            start_dt = datetime.combine(datetime.strptime(row.date, "%Y-%m-%d").date(), sch_time)
+                                            end_dt = start_dt + timedelta(minutes=sch_dur)
                                             
-                                            # デフォルト時間は適当に設定（例: 20:00）
-                                            sch_time = st.time_input(t("start_time"), value=datetime.strptime("20:00", "%H:%M").time(), key=f"time_{pop_key}")
-                                            sch_dur = st.number_input(t("study_duration_min"), value=20, step=10, key=f"dur_{pop_key}")
+                                            summary = f"📖 {t('study')}: {row.unit}"
+                                            description = f"{t('study_unit')}: {row.unit}\n{t('type')}: {row.type}"
                                             
-                                            if st.button(t("register"), key=f"btn_{pop_key}", type="primary"):
-                                                service, error = google_calendar_utils.get_calendar_service()
-                                                if error:
-                                                    st.error(error)
-                                                else:
-                                                    try:
-                                                        current_year = datetime.now().year
-                                                        date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
-                                                        
-                                                        start_dt = datetime.combine(date_obj, sch_time)
-                                                        end_dt = start_dt + timedelta(minutes=sch_dur)
-                                                        
-                                                        summary = f"📖 {t('study')}: {unit_name}"
-                                                        description = f"{t('study_unit')}: {unit_name}\n{t('type')}: {unit_type}"
-                                                        
-                                                        link, err = google_calendar_utils.add_event_to_calendar(service, summary, start_dt, end_dt, description)
-                                                        if link:
-                                                            st.success(t("registered_success"))
-                                                        elif err:
-                                                            st.error(f"{t('error')}: {err}")
-                                                    except Exception as e:
-                                                        st.error(f"{t('error')}: {e}")
-                                        
-                                    except Exception:
-                                        pass 
-                                
-                                st.caption(f"Total: {plan['time_minutes']}{t('minutes')}")
+                                            link, err = add_event_to_calendar(service, summary, start_dt, end_dt, description)
+                                            if link:
+                                                st.success(f"{row.unit}: {t('registered_success')}")
+                                            elif err:
+                                                st.error(f"{t('error')}: {err}")
+                                        except Exception as e:
+                                            st.error(f"{t('error')}: {e}")
                     
                     st.markdown('</div>', unsafe_allow_html=True)
 
@@ -3325,7 +3800,7 @@ if tab_selection == t("tab_dashboard"):
                     "name": "推論マスター",
                     "icon": "🏆",
                     "desc": "推論の正答率80%以上",
-                    "condition": lambda df: not df[df["ジャンル"]=="推論"].empty and (df[df["ジャンル"]=="推論"]["正誤"]=="〇").mean() >= 0.8
+                    "condition": lambda df: df.loc[df["ジャンル"] == "推論", "_correct"].mean() >= 0.8
                 }
             ]
             
@@ -3346,57 +3821,46 @@ if tab_selection == t("tab_dashboard"):
 
         def render_study_stats():
             # カレンダー下に統計情報を表示
-            col1, col2, col3 = st.columns(3)
-            
-            # 連続学習日数の計算
+            # 連続学習日数の計算（datetime64[D] のまま NumPy で処理）
             if not df_all.empty:
-                df_with_date = df_all.copy()
-                df_with_date["日付"] = pd.to_datetime(df_with_date["日付"]).dt.date
-                unique_dates = sorted(df_with_date["日付"].unique(), reverse=True)
+                day_arr = df_all["日付"].dropna().to_numpy().astype("datetime64[D]")
+                # np.unique は昇順なので反転して降順にする
+                unique_dates_desc = np.unique(day_arr)[::-1]
+                today64 = np.datetime64(TODAY, "D")
+                one_day = np.timedelta64(1, "D")
                 
                 current_streak = 0
                 max_streak = 0
-                temp_streak = 0
                 
-                if unique_dates:
+                if len(unique_dates_desc) > 0:
+                    # 隣接する日付の差が1日かどうか
+                    is_consecutive = (unique_dates_desc[:-1] - unique_dates_desc[1:]) == one_day
+                    
                     # 現在の連続日数
-                    today = datetime.today().date()
-                    if unique_dates[0] == today or (len(unique_dates) > 1 and unique_dates[0] == today - timedelta(days=1)):
-                        current_date = unique_dates[0]
-                        current_streak = 1
-                        for i in range(1, len(unique_dates)):
-                            if unique_dates[i] == current_date - timedelta(days=1):
-                                current_streak += 1
-                                current_date = unique_dates[i]
-                            else:
-                                break
+                    if unique_dates_desc[0] == today64 or (len(unique_dates_desc) > 1 and unique_dates_desc[0] == today64 - one_day):
+                        breaks = np.flatnonzero(~is_consecutive)
+                        current_streak = int(breaks[0] if breaks.size else is_consecutive.size) + 1
                     
-                    # 最長連続日数
-                    for i in range(len(unique_dates)):
-                        if i == 0:
-                            temp_streak = 1
-                        elif unique_dates[i-1] - unique_dates[i] == timedelta(days=1):
-                            temp_streak += 1
-                        else:
-                            max_streak = max(max_streak, temp_streak)
-                            temp_streak = 1
-                    max_streak = max(max_streak, temp_streak)
+                    # 最長連続日数（連続区間の境界位置の差 = 各区間の長さ）
+                    bounds = np.flatnonzero(np.concatenate(([True], ~is_consecutive, [True])))
+                    max_streak = int(np.diff(bounds).max())
                 
                 # 今月の統計
-                today = datetime.today()
-                this_month_data = df_with_date[
-                    (pd.to_datetime(df_with_date["日付"]).dt.month == today.month) &
-                    (pd.to_datetime(df_with_date["日付"]).dt.year == today.year)
-                ]
-                study_days_this_month = len(this_month_data["日付"].unique())
+                this_month = np.datetime64(today64, "M")
+                study_days_this_month = int((unique_dates_desc.astype("datetime64[M]") == this_month).sum())
             else:
                 current_streak = 0
                 max_streak = 0
                 study_days_this_month = 0
             
-            # 統計情報をカスタムスタイルで表示
-            st.markdown("""
+            # 統計情報をカスタムスタイルで表示（3枚のカードを1つのグリッドにまとめて出力）
+            stat_style = """
             <style>
+            .calendar-stat-grid {
+                display: grid;
+                grid-template-columns: repeat(3, 1fr);
+                gap: 16px;
+            }
             .calendar-stat {
                 text-align: center;
                 padding: 12px;
@@ -3421,7 +3885,7 @@ if tab_selection == t("tab_dashboard"):
                 font-weight: 600;
             }
             </style>
-            """, unsafe_allow_html=True)
+            """
             
             col1_html = f"""
             <div class="calendar-stat">
@@ -3447,12 +3911,8 @@ if tab_selection == t("tab_dashboard"):
             </div>
             """
             
-            with col1:
-                st.markdown(col1_html, unsafe_allow_html=True)
-            with col2:
-                st.markdown(col2_html, unsafe_allow_html=True)
-            with col3:
-                st.markdown(col3_html, unsafe_allow_html=True)
+            grid_html = f"<div class='calendar-stat-grid'>{col1_html}{col2_html}{col3_html}</div>"
+            st.markdown(stat_style + grid_html, unsafe_allow_html=True)
 
         def render_detailed_graphs():
             st.markdown("---")
@@ -3469,13 +3929,11 @@ if tab_selection == t("tab_dashboard"):
                 st.markdown(f"<div style='margin-bottom:10px; font-weight:bold;'><i class='bi bi-pentagon-half' style='color:#3b82f6;'></i> {t('graph_radar_title')}</div>", unsafe_allow_html=True)
                 
                 # Calculate accuracy per subject
-                df_subj = df_all.copy()
-                df_subj["is_correct"] = df_subj["正誤"].apply(lambda x: 1 if x == "〇" else 0)
-                subj_acc = df_subj.groupby("科目")["is_correct"].mean().reset_index()
+                subj_acc = df_all.groupby("科目", observed=True)["_correct"].mean().reset_index()
                 
                 if not subj_acc.empty:
                     categories = subj_acc["科目"].tolist()
-                    values = (subj_acc["is_correct"] * 100).tolist()
+                    values = (subj_acc["_correct"] * 100).tolist()
                     
                     # Close the loop for radar chart
                     categories.append(categories[0])
@@ -3487,7 +3945,7 @@ if tab_selection == t("tab_dashboard"):
                         theta=categories,
                         fill='toself',
                         fillcolor='rgba(59, 130, 246, 0.2)',
-                        name=t("accuracy_rate"),
+                        name=_T_ACC,
                         line=dict(color='#3b82f6', width=3),
                         marker=dict(size=8, color='#3b82f6')
                     ))
@@ -3570,7 +4028,7 @@ if tab_selection == t("tab_dashboard"):
         st.markdown("<div style='margin-top: 24px;'></div>", unsafe_allow_html=True)
         st.markdown(f"<div class='chart-header'><i class='bi bi-signpost-split icon-badge'></i>{t('study_roadmap')}</div>", unsafe_allow_html=True)
         
-        roadmap_data, current_phase, recommendations = generate_study_roadmap_detailed(df, st.session_state.df_master)
+        roadmap_data, current_phase, recommendations = cached_roadmap(df_key, df, st.session_state.df_master, st.session_state.language)
         
         if roadmap_data and current_phase and recommendations:
             # 現在のフェーズを強調表示
@@ -3608,31 +4066,24 @@ if tab_selection == t("tab_dashboard"):
             # 進捗バーを3つ表示
             col1, col2, col3 = st.columns(3)
             
+            # ステータス文言 -> (色, アイコン, 表示名) の対応表は翻訳を1回だけ引いて作る
+            status_lookup = {
+                t(key): (color, icon, t(label))
+                for key, (color, icon, label) in ROADMAP_STATUS_STYLE.items() if key != "default"
+            }
+            default_color, default_icon, default_label = ROADMAP_STATUS_STYLE["default"]
+            status_default = (default_color, default_icon, t(default_label))
+            
             for idx, (col, phase_key) in enumerate([(col1, "基礎固め"), (col2, "標準演習"), (col3, "応用演習")]):
                 with col:
                     progress = roadmap_data["progress"][idx]
                     accuracy = roadmap_data["accuracy"][idx]
                     status = roadmap_data["status"][idx]
                     
-                    # ステータスに応じた色とアイコン（日本語で判定）
-                    if status == t("status_completed"):
-                        status_color = "#10B981"
-                        status_icon = '<i class="bi bi-check-circle-fill" style="color:#10B981;"></i>'
-                        status_text_color = "#10B981"
-                        display_status = t("completed")
-                    elif status == t("status_in_progress"):
-                        status_color = "#F59E0B"
-                        status_icon = '<i class="bi bi-arrow-repeat" style="color:#F59E0B;"></i>'
-                        status_text_color = "#F59E0B"
-                        display_status = t("in_progress")
-                        display_status = t("in_progress")
-                    else:
-                        status_color = "#6B7280" # Darker gray for better contrast
-                        status_icon = '<i class="bi bi-pause-circle" style="color:#6B7280;"></i>'
-                        status_text_color = "#6B7280"
-                        display_status = t("not_started")
-                    
-                        display_status = t("not_started")
+                    # ステータスに応じた色とアイコン
+                    status_color, status_icon_cls, display_status = status_lookup.get(status, status_default)
+                    status_icon = f'<i class="bi {status_icon_cls}" style="color:{status_color};"></i>'
+                    status_text_color = status_color
                     
                     units_list = "<br>".join([f"・{dt(u)}" for u in roadmap_data["units"][idx]])
                     
@@ -3734,7 +4185,7 @@ if tab_selection == t("tab_dashboard"):
             <span style="font-weight: 700; color: #0f172a;">{progress:.0f}%</span>
         </div>
         <div style="display: flex; justify-content: space-between; font-size: 0.85rem; color: #334155; margin-bottom: 12px;">
-            <span>{t('accuracy_rate')}</span>
+            <span>{_T_ACC}</span>
             <span style="font-weight: 700; color: #0f172a;">{accuracy:.0f}%</span>
         </div>
         <div style="
@@ -3768,9 +4219,7 @@ if tab_selection == t("tab_dashboard"):
                 <div style="display:flex; align-items:center; gap:8px; margin-bottom:12px; color:#1e293b; font-weight:700;">
                     <i class="bi bi-lightbulb-fill" style="color:#f59e0b;"></i> {t('next_steps')}
                 </div>
-                <ul style="margin:0; padding-left:20px; color:#475569;">
-                    {''.join([f'<li style="margin-bottom:8px;">{rec}</li>' for rec in recommendations])}
-                </ul>
+                {_next_steps_html(tuple(recommendations))}
             </div>
             """, unsafe_allow_html=True)
         else:
@@ -3784,7 +4233,7 @@ if tab_selection == t("tab_dashboard"):
 
         # ===== 逆算ロードマップ =====
         if st.session_state.exam_date:
-            roadmap_fig = generate_roadmap(st.session_state.exam_date, cor_r, tgt_r)
+            roadmap_fig = cached_roadmap_chart(st.session_state.exam_date, cor_r, tgt_r, st.session_state.language)
             if roadmap_fig:
                 sac.divider(label=t('roadmap_to_pass'), icon='map', align='center')
                 st.plotly_chart(roadmap_fig, use_container_width=True, config={'displayModeBar': False})
@@ -3797,26 +4246,29 @@ if tab_selection == t("tab_dashboard"):
         with m1:
             st.markdown(f'<div class="chart-header"><i class="bi bi-graph-up icon-badge"></i>{t("daily_accuracy_trend")}</div>', unsafe_allow_html=True)
             bd = bd.sort_values("日").reset_index(drop=True)
-            bd["日_label"] = pd.to_datetime(bd["日"]).dt.day.astype(str) + t("day_suffix")
+            bd["日_label"] = bd["日"].dt.day.astype(str) + t("day_suffix")
+            # Plotly には Series ではなく ndarray を渡す（リスト変換を省く）
+            day_labels = bd["日_label"].to_numpy()
+            rate_pct = bd["正答率"].to_numpy() * 100
             fig = go.Figure()
             fig.add_trace(go.Scatter(
-                x=bd["日_label"],
-                y=(bd["正答率"] * 100),
+                x=day_labels,
+                y=rate_pct,
                 mode='lines+markers+text',
-                text=(bd["正答率"] * 100).round(0).astype(int).astype(str) + '%',
+                text=np.char.add(np.round(rate_pct).astype(int).astype(str), '%'),
                 textposition="top center",
                 line=dict(color=PRIMARY, width=3, shape='spline'),
                 fill='tozeroy',
                 fillcolor='rgba(59, 130, 246, 0.1)',
                 marker=dict(size=8, color=PRIMARY, line=dict(color='white', width=2)),
-                name=t("accuracy_rate"),
-                hovertemplate=f'<b>%{{x}}</b><br>{t("accuracy_rate")}：%{{y:.0f}}%<extra></extra>'
+                name=_T_ACC,
+                hovertemplate=f'<b>%{{x}}</b><br>{_T_ACC}：%{{y:.0f}}%<extra></extra>'
             ))
             last_rate = bd["正答率"].iloc[-1] if len(bd) > 0 else cor_r
             target_color = SUCCESS if last_rate >= tgt_r else DANGER
             target_y = tgt_r * 100
             fig.update_layout(shapes=[
-                dict(type="line", xref="x", x0=bd["日_label"].iloc[0], x1=bd["日_label"].iloc[-1],
+                dict(type="line", xref="x", x0=day_labels[0], x1=day_labels[-1],
                      yref="y", y0=target_y, y1=target_y,
                      line=dict(color=target_color, width=2, dash="dash"))
             ])
@@ -3837,27 +4289,8 @@ if tab_selection == t("tab_dashboard"):
         with m2:
             currentRate_pct = int(round(cor_r * 100))
             targetRate_pct = int(round(tgt_r * 100))
-            circumference = 2 * np.pi * 45
-            dash = (currentRate_pct / 100.0) * circumference
-            remaining = circumference - dash
-            svg = f"""
-            <div class="metric-card" style="display:flex; align-items:center; justify-content:center; height:300px;">
-              <div class="flex flex-col items-center">
-                <div class="relative" style="width:160px; height:160px;">
-                  <svg viewBox="0 0 100 100" style="transform: rotate(-90deg);">
-                    <circle cx="50" cy="50" r="45" fill="none" stroke="var(--border)" stroke-width="8" />
-                    <circle cx="50" cy="50" r="45" fill="none" stroke="{SUCCESS if cor_r >= tgt_r else DANGER}" stroke-width="8"
-                            stroke-dasharray="{dash:.2f} {remaining:.2f}" stroke-linecap="round" />
-                  </svg>
-                  <div style="position:absolute; inset:0; display:flex; flex-direction:column; align-items:center; justify-content:center;">
-                    <span style="font-size:2rem; font-weight:800; color:var(--card-foreground);">{currentRate_pct}%</span>
-                    <span style="font-size:1rem; color:var(--muted-foreground);">/ {targetRate_pct}%</span>
-                  </div>
-                </div>
-              </div>
-            </div>
-            """
-            st.markdown(svg, unsafe_allow_html=True)
+            gauge_color = SUCCESS if cor_r >= tgt_r else DANGER
+            st.markdown(_gauge_svg(currentRate_pct, targetRate_pct, gauge_color), unsafe_allow_html=True)
 
         # ===== 下部グラフ =====
         b1, b2 = st.columns(2)
@@ -3866,25 +4299,26 @@ if tab_selection == t("tab_dashboard"):
             st.markdown(f'<div class="chart-header"><i class="bi bi-list-check icon-badge"></i>{t("top_5_priority_units")}</div>', unsafe_allow_html=True)
             t5 = agg.head(5).reset_index(drop=True)
             if not t5.empty:
-                t5["単元_label"] = t5["単元"].apply(dt)
-                max_v = max(t5["優先度"].max(), 1.0)
+                unit_labels = np.array([dt(u) for u in t5["単元"]])
+                priorities = t5["優先度"].to_numpy()
+                max_v = max(priorities.max(), 1.0)
                 pad = max_v * 0.18
                 x_max = max_v + pad
                 fig = go.Figure()
                 fig.add_trace(go.Bar(
-                    y=t5["単元_label"],
-                    x=[x_max] * len(t5),
+                    y=unit_labels,
+                    x=np.full(len(t5), x_max),
                     orientation='h',
                     marker=dict(color='rgba(234,239,243,0.5)'),
                     hoverinfo='none',
                     showlegend=False
                 ))
                 fig.add_trace(go.Bar(
-                    y=t5["単元_label"],
-                    x=t5["優先度"],
+                    y=unit_labels,
+                    x=priorities,
                     orientation='h',
                     marker=dict(color=PRIMARY, line=dict(color='rgba(0,0,0,0.06)', width=0)),
-                    text=t5["優先度"].apply(lambda x: f"{x:.1f}"),
+                    text=np.char.mod("%.1f", priorities),
                     textposition='auto',
                     hovertemplate=f'%{{y}}<br>{t("priority")}：%{{x:.2f}}<extra></extra>',
                     name=t('priority')
@@ -3905,15 +4339,16 @@ if tab_selection == t("tab_dashboard"):
 
         with b2:
             st.markdown(f'<div class="chart-header"><i class="bi bi-pie-chart icon-badge"></i>{t("incorrect_answer_cause_analysis")}</div>', unsafe_allow_html=True)
+            cause_counts = cau[_T_COUNT].to_numpy()
             fig = go.Figure(go.Bar(
-                x=cau[t("cause")],
-                y=cau[t("count")],
-                text=cau[t("count")],
+                x=cau[_T_CAUSE].to_numpy(),
+                y=cause_counts,
+                text=cause_counts,
                 textposition='auto',
                 marker=dict(color=ACCENT, line=dict(color='rgba(0,0,0,0.06)', width=1)),
-                hovertemplate=f'%{{x}}<br>{t("count")}：%{{y}}<extra></extra>'
+                hovertemplate=f'%{{x}}<br>{_T_COUNT}：%{{y}}<extra></extra>'
             ))
-            max_y = max(cau[t("count")].max() if not cau.empty else 1, 1)
+            max_y = max(cau[_T_COUNT].max() if not cau.empty else 1, 1)
             fig.update_layout(
                 template='simple_white',
                 paper_bgcolor='rgba(0,0,0,0)',
@@ -3929,163 +4364,177 @@ if tab_selection == t("tab_dashboard"):
             st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False})
 
         # ===== AI時系列予測（Prophet） =====
-        # Prophet予測（試験日が設定されている場合のみ）
-        if st.session_state.get("exam_date") is not None and len(bd) >= 5:
-            prophet_result, error_msg = predict_with_prophet(df, tgt_r, st.session_state.exam_date)
+        def render_prophet_panel(df, tgt_r, exam_date):
+            # Prophet予測（試験日が設定されている場合のみ）
+            if exam_date is not None and len(bd) >= 5:
+                prophet_result, error_msg = cached_prophet(df_key, df, tgt_r, exam_date, st.session_state.language)
             
-            if prophet_result:
-                st.markdown("---")
-                st.markdown(f'<div class="chart-header"><i class="bi bi-graph-up-arrow icon-badge"></i>{t("ai_time_series_prediction_prophet")}</div>', unsafe_allow_html=True)
-                st.caption(t("prophet_desc"))
+                if prophet_result:
+                    st.markdown("---")
+                    st.markdown(f'<div class="chart-header"><i class="bi bi-graph-up-arrow icon-badge"></i>{t("ai_time_series_prediction_prophet")}</div>', unsafe_allow_html=True)
+                    st.caption(t("prophet_desc"))
                 
-                col_p1, col_p2 = st.columns([1, 2])
+                    col_p1, col_p2 = st.columns([1, 2])
                 
-                with col_p1:
-                    predicted_rate = prophet_result["predicted_rate"]
-                    # 0-1の範囲にクリップ
-                    predicted_rate = max(0, min(1, predicted_rate))
+                    with col_p1:
+                        predicted_rate = prophet_result["predicted_rate"]
+                        # 0-1の範囲にクリップ
+                        predicted_rate = max(0, min(1, predicted_rate))
                     
-                    st.metric(
-                        t("exam_day_predicted_accuracy"),
-                        f"{predicted_rate:.1%}",
-                        delta=f"{(predicted_rate - cor_r):.1%}"
-                    )
+                        st.metric(
+                            t("exam_day_predicted_accuracy"),
+                            f"{predicted_rate:.1%}",
+                            delta=f"{(predicted_rate - cor_r):.1%}"
+                        )
                     
-                    if predicted_rate >= tgt_r:
-                        sac.alert(t("goal_achievement_likely"), icon='check-circle', color='success', size='sm')
-                    else:
-                        gap = tgt_r - predicted_rate
-                        sac.alert(f"⚠️ {t('goal_shortage').format(gap=gap)}", icon='exclamation-circle', color='warning', size='sm')
+                        if predicted_rate >= tgt_r:
+                            sac.alert(t("goal_achievement_likely"), icon='check-circle', color='success', size='sm')
+                        else:
+                            gap = tgt_r - predicted_rate
+                            sac.alert(f"⚠️ {t('goal_shortage').format(gap=gap)}", icon='exclamation-circle', color='warning', size='sm')
                 
-                with col_p2:
-                    # 予測グラフ（実績 + 予測）
-                    forecast_df = prophet_result["forecast"]
-                    actual_df = prophet_result["actual_data"]
-                    
-                    fig_prophet = go.Figure()
+                    with col_p2:
+                        # 予測グラフ（実績 + 予測）
+                        forecast_df = prophet_result["forecast"]
+                        actual_df = prophet_result["actual_data"]
                     
-                    # 実績データ
-                    fig_prophet.add_trace(go.Scatter(
-                        x=actual_df["ds"],
-                        y=actual_df["y"],
-                        mode='markers',
-                        name=t('actual_results'),
-                        marker=dict(size=8, color=PRIMARY)
-                    ))
+                        fig_prophet = go.Figure()
+                        forecast_dates = forecast_df["日付"].to_numpy()
                     
-                    # 予測ライン
-                    fig_prophet.add_trace(go.Scatter(
-                        x=forecast_df["日付"],
-                        y=forecast_df["予測正答率"],
-                        mode='lines',
-                        name=t('prediction'),
-                        line=dict(color=ACCENT, width=2)
-                    ))
+                        # 実績データ（予測系列は点数が多いので WebGL で描画）
+                        fig_prophet.add_trace(go.Scattergl(
+                            x=actual_df["ds"].to_numpy(),
+                            y=actual_df["y"].to_numpy(),
+                            mode='markers',
+                            name=t('actual_results'),
+                            marker=dict(size=8, color=PRIMARY)
+                        ))
                     
-                    # 信頼区間
-                    fig_prophet.add_trace(go.Scatter(
-                        x=forecast_df["日付"],
-                        y=forecast_df["上限"],
-                        mode='lines',
-                        name=t('upper_bound'),
-                        line=dict(width=0),
-                        showlegend=False
-                    ))
+                        # 予測ライン
+                        fig_prophet.add_trace(go.Scattergl(
+                            x=forecast_dates,
+                            y=forecast_df["予測正答率"].to_numpy(),
+                            mode='lines',
+                            name=t('prediction'),
+                            line=dict(color=ACCENT, width=2)
+                        ))
                     
-                    fig_prophet.add_trace(go.Scatter(
-                        x=forecast_df["日付"],
-                        y=forecast_df["下限"],
-                        mode='lines',
-                        name=t('lower_bound'),
-                        fill='tonexty',
-                        fillcolor='rgba(249, 115, 22, 0.2)',
-                        line=dict(width=0),
-                        showlegend=False
-                    ))
+                        # 信頼区間（上限を往路・下限を復路にした1つの多角形で塗る）
+                        band_x = np.concatenate([forecast_dates, forecast_dates[::-1]])
+                        band_y = np.concatenate([forecast_df["上限"].to_numpy(), forecast_df["下限"].to_numpy()[::-1]])
+                        fig_prophet.add_trace(go.Scattergl(
+                            x=band_x,
+                            y=band_y,
+                            mode='lines',
+                            name=f"{t('lower_bound')} - {t('upper_bound')}",
+                            fill='toself',
+                            fillcolor='rgba(249, 115, 22, 0.2)',
+                            line=dict(width=0),
+                            hoverinfo='skip',
+                            showlegend=False
+                        ))
                     
-                    # 目標ライン
-                    fig_prophet.add_hline(
-                        y=tgt_r,
-                        line_dash="dash",
-                        line_color="red",
-                        annotation_text=t("goal")
-                    )
+                        # 目標ライン
+                        fig_prophet.add_hline(
+                            y=tgt_r,
+                            line_dash="dash",
+                            line_color="red",
+                            annotation_text=t("goal")
+                        )
                     
-                    fig_prophet.update_layout(
-                        height=250,
-                        margin=dict(l=20, r=20, t=20, b=20),
-                        yaxis=dict(tickformat=".0%", range=[0, 1.05]),
-                        xaxis_title=t("date"),
-                        yaxis_title=t("accuracy_rate"),
-                        legend=dict(orientation="h", yanchor="top", y=-0.2),
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        plot_bgcolor='rgba(0,0,0,0)'
-                    )
+                        fig_prophet.update_layout(
+                            height=250,
+                            margin=dict(l=20, r=20, t=20, b=20),
+                            yaxis=dict(tickformat=".0%", range=[0, 1.05]),
+                            xaxis_title=_T_DATE,
+                            yaxis_title=_T_ACC,
+                            legend=dict(orientation="h", yanchor="top", y=-0.2),
+                            paper_bgcolor='rgba(0,0,0,0)',
+                            plot_bgcolor='rgba(0,0,0,0)'
+                        )
                     
-                    st.plotly_chart(fig_prophet, use_container_width=True, config={'displayModeBar': False})
-            elif error_msg:
-                sac.alert(f"{t('prophet_prediction')}: {error_msg}", icon='info-circle', color='info', size='sm')
+                        st.plotly_chart(fig_prophet, use_container_width=True, config={'displayModeBar': False})
+                elif error_msg:
+                    sac.alert(f"{t('prophet_prediction')}: {error_msg}", icon='info-circle', color='info', size='sm')
+
+        render_prophet_panel(df, tgt_r, st.session_state.get("exam_date"))
 
         # --- 詳細分析（ヒートマップ・散布図） ---
         sac.divider(label=t('detailed_analysis'), icon='search', align='center')
         
         c_h1, c_h2 = st.columns(2)
-        with c_h1:
+        # 集計はキャッシュ済みの関数から取り、描画だけをパネルごとの関数にまとめる
+        def render_heatmap_panel(df):
             st.markdown(f'<div class="chart-header"><i class="bi bi-grid-3x3 icon-badge"></i>{t("accuracy_by_field")}</div>', unsafe_allow_html=True)
-            heatmap_data = df.groupby(["科目", "ジャンル"])["ミス"].agg(["sum", "count"]).reset_index()
-            heatmap_data["正答率"] = (heatmap_data["count"] - heatmap_data["sum"]) / heatmap_data["count"]
-            heatmap_matrix = heatmap_data.pivot(index="ジャンル", columns="科目", values="正答率")
+            heatmap_matrix = _compute_heatmap(df_key, df)
             
             # 翻訳適用
             heatmap_matrix.index = [dt(idx) for idx in heatmap_matrix.index]
             heatmap_matrix.columns = [dt(col) for col in heatmap_matrix.columns]
             
-            fig_heat = px.imshow(
-                heatmap_matrix,
-                labels=dict(x=t("subject"), y=t("genre"), color=t("accuracy_rate")),
-                x=heatmap_matrix.columns,
-                y=heatmap_matrix.index,
-                color_continuous_scale="RdBu", # Changed back to RdBu for visibility (Red=Low, Blue=High)
+            # plotly.express を通さず、行列をそのまま go.Heatmap に渡す
+            fig_heat = go.Figure(go.Heatmap(
+                z=heatmap_matrix.to_numpy(),
+                x=heatmap_matrix.columns.tolist(),
+                y=heatmap_matrix.index.tolist(),
+                colorscale="RdBu", # Changed back to RdBu for visibility (Red=Low, Blue=High)
                 zmin=0, zmax=1,
-                aspect="auto",
-                text_auto='.0%' # Show values
-            )
-            fig_heat.update_traces(xgap=3, ygap=3)
+                texttemplate="%{z:.0%}", # Show values
+                hovertemplate=f"{t('genre')}: %{{y}}<br>{_T_SUBJECT}: %{{x}}<br>{_T_ACC}: %{{z:.0%}}<extra></extra>",
+                colorbar=dict(title=_T_ACC, tickformat=".0%"),
+                xgap=3, ygap=3
+            ))
             fig_heat.update_layout(
                 template='simple_white',
                 height=320, 
                 margin=dict(l=0,r=0,t=30,b=0),
                 paper_bgcolor='rgba(0,0,0,0)',
                 plot_bgcolor='rgba(0,0,0,0)',
-                coloraxis_colorbar=dict(title=t("accuracy_rate"), tickformat=".0%")
+                xaxis_title=_T_SUBJECT,
+                yaxis=dict(title=t("genre"), autorange='reversed')
             )
             st.plotly_chart(fig_heat, use_container_width=True)
             
-        with c_h2:
+
+        def render_scatter_panel(df):
             st.markdown(f'<div class="chart-header"><i class="bi bi-crosshair icon-badge"></i>{t("weakness_analysis_4_quadrants")}</div>', unsafe_allow_html=True)
-            unit_stats = df.groupby("単元").agg({
-                "解答時間(秒)": "mean",
-                "ミス": ["sum", "count"],
-                "科目": "first"
-            }).reset_index()
-            unit_stats.columns = ["単元", "平均解答時間", "ミス数", "試行回数", "科目"]
-            unit_stats["正答率"] = (unit_stats["試行回数"] - unit_stats["ミス数"]) / unit_stats["試行回数"]
+            unit_stats = _compute_unit_stats(df_key, df)
             
             # 平均値を計算（象限の基準）
             avg_time = unit_stats["平均解答時間"].mean()
             avg_acc = unit_stats["正答率"].mean()
             max_time = unit_stats["平均解答時間"].max()
             
-            fig_scatter = px.scatter(
-                unit_stats,
-                x="平均解答時間",
-                y="正答率",
-                size="試行回数",
-                color="科目",
-                hover_name="単元",
-                color_discrete_sequence=[PRIMARY, ACCENT, SUCCESS],
-                opacity=0.9
-            )
+            # 科目ごとにトレースを分けず、色は科目コードから点ごとに割り当てる
+            # （科目が4つ以上でも色が重ならないよう、不足分は Plotly の定性パレットで補う）
+            subj_cat = unit_stats["科目"].astype("category").cat.remove_unused_categories()
+            subjects = subj_cat.cat.categories
+            palette = np.array(([PRIMARY, ACCENT, SUCCESS] + px.colors.qualitative.Plotly)[:max(len(subjects), 1)])
+            codes = subj_cat.cat.codes.to_numpy()
+            attempts = unit_stats["試行回数"].to_numpy()
+            fig_scatter = go.Figure(go.Scattergl(
+                x=unit_stats["平均解答時間"].to_numpy(),
+                y=unit_stats["正答率"].to_numpy(),
+                mode='markers',
+                marker=dict(
+                    size=attempts,
+                    sizemode='area',
+                    sizeref=2.0 * attempts.max() / (20 ** 2),  # px.scatter の size_max=20 相当
+                    color=palette[codes % len(palette)],
+                    opacity=0.9,
+                    line=dict(width=1, color='white')
+                ),
+                customdata=np.column_stack([unit_stats["単元"].to_numpy(), unit_stats["科目"].to_numpy(), attempts]),
+                hovertemplate=f"<b>%{{customdata[0]}}</b><br>{_T_SUBJECT}: %{{customdata[1]}}<br>{t('avg_answer_time_sec')}: %{{x:.1f}}<br>{_T_ACC}: %{{y:.0%}}<br>{t('attempts')}: %{{customdata[2]}}<extra></extra>",
+                showlegend=False
+            ))
+            # 凡例用のダミートレース（点は描かず、科目と色の対応だけを示す）
+            for i, subj in enumerate(subjects):
+                fig_scatter.add_trace(go.Scattergl(
+                    x=[None], y=[None], mode='markers', name=str(subj),
+                    marker=dict(size=10, color=palette[i % len(palette)]),
+                    hoverinfo='skip', showlegend=True
+                ))
             
             # 象限の背景色（Shapes）
             # 1. 左上 (Ideal): Fast & High Acc
@@ -4111,19 +4560,23 @@ if tab_selection == t("tab_dashboard"):
             # 右下 (遅い・低い): 基礎不足
             fig_scatter.add_annotation(x=avg_time + (max_time-avg_time)*0.5, y=max(0.0, avg_acc - 0.05), text=t("needs_review"), showarrow=False, font=dict(color=DANGER, size=12, weight="bold"))
             
-            fig_scatter.update_traces(marker=dict(line=dict(width=1, color='white')))
             fig_scatter.update_layout(
                 template='simple_white',
                 height=320, 
                 margin=dict(l=0,r=0,t=30,b=0), 
-                yaxis=dict(range=[-0.05, 1.05], tickformat=".0%", title=t("accuracy_rate")),
+                yaxis=dict(range=[-0.05, 1.05], tickformat=".0%", title=_T_ACC),
                 xaxis=dict(title=t("avg_answer_time_sec"), range=[0, max_time*1.1]),
+                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="left", x=0, title=None),
                 paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+                plot_bgcolor='rgba(0,0,0,0)'
             )
             st.plotly_chart(fig_scatter, use_container_width=True)
 
+        with c_h1:
+            render_heatmap_panel(df)
+        with c_h2:
+            render_scatter_panel(df)
+
         # ===== 詳細分析グラフ（科目別習熟度・学習バランス） =====
         render_detailed_graphs()
         
@@ -4132,9 +4585,19 @@ if tab_selection == t("tab_dashboard"):
         if cs.empty:
             st.info(t("no_subject_data"))
         else:
+            # 色・差分・バー幅は列演算でまとめて計算し、HTMLはテンプレートから一括生成
+            rates = cs["正答率"].to_numpy()
+            deltas = rates - tgt_r
+            value_cols = np.select([rates >= 1.0, rates >= tgt_r], [PRIMARY, SUCCESS], default=DANGER)
+            delta_cols = np.select([deltas > 0, deltas < 0], [SUCCESS, DANGER], default="#000")
+            widths = np.clip((rates * 100).astype(np.int32), 0, 100)
+            card_htmls = [
+                SUBJECT_CARD_TEMPLATE.format(subj_name=name, r=r, delta=d, value_col=vc, delta_col=dc, width=w)
+                for name, r, d, vc, dc, w in zip(cs["科目"], rates, deltas, value_cols, delta_cols, widths)
+            ]
+            
             cols_display = st.columns(len(cs))
-            for i, row in enumerate(cs.itertuples()):
-                subj_name = row.科目
+            for i, (subj_name, card_html) in enumerate(zip(cs["科目"], card_htmls)):
                 with cols_display[i]:
                     key_btn = f"subj_btn_{i}_{subj_name}"
                     clicked = st.button(subj_name, key=key_btn)
@@ -4143,46 +4606,23 @@ if tab_selection == t("tab_dashboard"):
                             st.session_state.selected_subject = None
                         else:
                             st.session_state.selected_subject = subj_name
-
-                    r = row.正答率
-                    delta = r - tgt_r
-                    if r >= 1.0:
-                        value_col = PRIMARY
-                    elif r >= tgt_r:
-                        value_col = SUCCESS
-                    else:
-                        value_col = DANGER
-                    delta_col = SUCCESS if delta > 0 else (DANGER if delta < 0 else "#000")
-                    width = min(max(int(r * 100), 0), 100)
-                    
-                    html = f'''
-                    <div style="text-align:center; margin-bottom:16px; cursor:pointer;">
-                        <div style="font-size:0.9rem; color:#6B7280; margin-bottom:4px;">{subj_name}</div>
-                        <div style="font-size:1.5rem; font-weight:700; color:{value_col}; line-height:1;">{r:.0%}</div>
-                        <div style="font-size:0.75rem; color:{delta_col}; margin-bottom:8px;">{delta:+.0%}</div>
-                        <div style="background-color:#E5E7EB; height:4px; border-radius:2px; width:100%; overflow:hidden;">
-                            <div style="background-color:{value_col}; height:100%; width:{width}%;"></div>
-                        </div>
-                    </div>
-                    '''
-                    st.markdown(html, unsafe_allow_html=True)
+                    st.markdown(card_html, unsafe_allow_html=True)
 
             sel = st.session_state.get("selected_subject", None)
             if sel:
                 sac.divider(label=f'<i class="bi bi-search"></i> {sel} {t("unit_accuracy_rate")}', icon='search', align='left')
-                units = df[df["科目"] == sel].groupby("単元")["ミス"].agg(["sum", "count"]).reset_index()
-                if units.empty:
+                subject_units = _subject_unit_stats(df_key, df)
+                if sel not in subject_units.index.get_level_values("科目"):
                     st.info(t("no_data_for_subject"))
                 else:
-                    units["正答率"] = (units["count"] - units["sum"]) / units["count"]
-                    units = units.sort_values("正答率", ascending=False).reset_index(drop=True)
+                    units = subject_units.xs(sel, level="科目").sort_values("正答率", ascending=False).reset_index()
                     
                     # Translate unit names
                     # Keep original for search query if needed, but here we use translated for simplicity or add logic
                     # Actually, for better search results in Japan, maybe we should keep Japanese?
                     # But the user might be English speaker.
                     # Let's use the translated name for now.
-                    units["単元"] = units["単元"].apply(dt)
+                    units["単元"] = dt_series(units["単元"])
                     
                     # Add search link
                     units["link"] = units["単元"].apply(lambda x: f"https://www.youtube.com/results?search_query={urllib.parse.quote('SPI ' + x)}")
@@ -4195,8 +4635,8 @@ if tab_selection == t("tab_dashboard"):
 <table style="width:100%; border-collapse: collapse; font-size:0.9rem;">
 <thead>
 <tr style="border-bottom:2px solid #e5e7eb; color:#6b7280; font-size:0.85rem;">
-<th style="padding:12px 8px; text-align:left;">{t("unit")}</th>
-<th style="padding:12px 8px; text-align:left; width:40%;">{t("accuracy_rate")}</th>
+<th style="padding:12px 8px; text-align:left;">{_T_UNIT}</th>
+<th style="padding:12px 8px; text-align:left; width:40%;">{_T_ACC}</th>
 <th style="padding:12px 8px; text-align:center;">{t("attempts")}</th>
 <th style="padding:12px 8px; text-align:center;">{t("resources")}</th>
 </tr>
@@ -4255,19 +4695,19 @@ if tab_selection == t("tab_data_list"):
     col_dl1, col_dl2, col_dl3 = st.columns(3)
     
     with col_dl1:
-        csv_log = st.session_state.df_log_manual.to_csv(index=False).encode('utf-8-sig')
+        csv_log = csv_bytes(st.session_state.df_log_manual)
         st.download_button(t("learning_log_csv"), data=csv_log, file_name=f"study_log_{st.session_state.current_user}.csv", mime="text/csv", use_container_width=True)
         
     with col_dl2:
         if not st.session_state.df_notes.empty:
-            csv_notes = st.session_state.df_notes.to_csv(index=False).encode('utf-8-sig')
+            csv_notes = csv_bytes(st.session_state.df_notes)
             st.download_button(t("review_notes_csv"), data=csv_notes, file_name=f"review_notes_{st.session_state.current_user}.csv", mime="text/csv", use_container_width=True)
         else:
             st.button(t("review_notes_none"), disabled=True, use_container_width=True)
             
     with col_dl3:
         if not agg.empty:
-            csv_agg = agg.to_csv(index=False).encode('utf-8-sig')
+            csv_agg = csv_bytes(agg.drop(columns=["q_count"]))
             st.download_button(t("unit_summary_csv"), data=csv_agg, file_name=f"unit_stats_{st.session_state.current_user}.csv", mime="text/csv", use_container_width=True)
         else:
             st.button(t("unit_summary_none"), disabled=True, use_container_width=True)
@@ -4298,8 +4738,8 @@ if tab_selection == t("tab_data_list"):
             }
         )
         
-        # 編集があった場合、日付を文字列に戻して保存
-        if not edited_df.equals(df_editor):
+        # 編集があった場合、日付を文字列に戻して保存（セル単位の比較ではなくハッシュで判定）
+        if _frame_hash(edited_df) != _frame_hash(df_editor):
             edited_df["日付"] = edited_df["日付"].apply(lambda x: x.strftime("%Y-%m-%d") if pd.notnull(x) else "")
             st.session_state.df_log_manual = edited_df
             
@@ -4320,7 +4760,7 @@ if tab_selection == t("tab_data_list"):
             except Exception as e:
                 st.error(f"保存処理エラー: {str(e)}")
         
-        csv = st.session_state.df_log_manual.to_csv(index=False).encode('utf-8-sig')
+        csv = csv_bytes(st.session_state.df_log_manual)
         st.download_button(
             label=t("download_csv"),
             data=csv,
@@ -4332,9 +4772,15 @@ if tab_selection == t("tab_data_list"):
     uploaded = st.file_uploader(t("replace_data_csv"), type=["csv"], key="tab2_upload")
     if uploaded is not None:
         try:
-            df_new = pd.read_csv(uploaded)
+            # pyarrow エンジン（マルチスレッド）で読み込み、使えない場合は標準エンジンで読み直す
+            try:
+                df_new = pd.read_csv(uploaded, engine="pyarrow")
+            except Exception:
+                uploaded.seek(0)
+                df_new = pd.read_csv(uploaded)
             required = ["日付", "問題ID", "正誤", "解答時間(秒)", "ミスの原因", "学習投入時間(分)"]
-            missing = [c for c in required if c not in df_new.columns]
+            missing_set = set(required) - set(df_new.columns)
+            missing = [c for c in required if c in missing_set]
             if missing:
                 st.error(t("missing_csv_columns").format(columns=', '.join(missing)))
             else:
@@ -4413,94 +4859,71 @@ if tab_selection == t("tab_ai_analysis"):
         
         # モデル学習
         with st.spinner(t("ai_model_training")):
-            model_acc, importances, encoders = train_ai_models(df)
+            model_acc, importances, encoders = train_ai_models(df_key, df)
             
         if model_acc is None:
             st.error(t("model_training_failed"))
         else:
-            le_subj, le_unit, min_date = encoders
+            _, _, min_date = encoders
             
             # 1. 未来予測
             sac.divider(label=t('accuracy_prediction_simulation'), icon='graph-up-arrow', align='left')
-            col_ai1, col_ai2 = st.columns([1, 2])
-            with col_ai1:
-                target_date = st.date_input(t("prediction_date"), value=datetime.today() + timedelta(days=7))
-                days_future = (pd.to_datetime(target_date) - min_date).days
-                
-                # 予測用ダミーデータ作成（平均的な学習条件で予測）
-                avg_time = df["解答時間(秒)"].mean()
-                avg_study = df["学習投入時間(分)"].mean()
-                
-                X_pred = []
-                # 学習データに含まれるユニークな科目・単元のペアを取得
-                unique_pairs = df[["科目", "単元"]].drop_duplicates()
+            # 日数計算は Timestamp を作らず Python の date 同士で行う
+            min_day = min_date.date()
+            default_target_date = datetime.today().date() + timedelta(days=7)
+            current_days = (datetime.today().date() - min_day).days
+            n_future = 30
+            
+            # 予測日の変更ではこの部分だけを再実行する
+            @st.fragment
+            def render_future_prediction(df, min_day, tgt_r, cor_r):
+                col_ai1, col_ai2 = st.columns([1, 2])
+                with col_ai1:
+                    target_date = st.date_input(t("prediction_date"), value=default_target_date, key="ai_target_date")
+                    days_future = (target_date - min_day).days
                 
-                for _, row in unique_pairs.iterrows():
-                    try:
-                        s_c = le_subj.transform([row["科目"]])[0]
-                        u_c = le_unit.transform([row["単元"]])[0]
-                        X_pred.append([days_future, s_c, u_c, avg_time, avg_study])
-                    except:
-                        pass
+                    _, final_pred, future_preds, _ = _ai_predictions(df_key, df, days_future, current_days, n_future)
                 
-                if X_pred:
-                    pred_accs = model_acc.predict(X_pred)
-                    final_pred = np.mean(pred_accs)
-                    
-                    st.metric(t("predicted_accuracy"), f"{final_pred:.1%}", delta=f"{(final_pred - cor_r):.1%}")
-                    if final_pred >= tgt_r:
-                        sac.alert(t("goal_achievement_likely"), icon='check-circle', color='success', size='sm')
-                    else:
-                        sac.alert(t("goal_not_achieved"), icon='exclamation-circle', color='warning', size='sm')
+                    if final_pred is not None:
+                        st.metric(t("predicted_accuracy"), f"{final_pred:.1%}", delta=f"{(final_pred - cor_r):.1%}")
+                        if final_pred >= tgt_r:
+                            sac.alert(t("goal_achievement_likely"), icon='check-circle', color='success', size='sm')
+                        else:
+                            sac.alert(t("goal_not_achieved"), icon='exclamation-circle', color='warning', size='sm')
             
-            with col_ai2:
-                # 予測推移グラフ（向こう30日）
-                future_days = range(days_future, days_future + 30)
-                future_preds = []
-                for d in future_days:
-                    # 各日の予測（全単元平均）
-                    X_d = [[d, x[1], x[2], x[3], x[4]] for x in X_pred]
-                    preds = model_acc.predict(X_d)
-                    future_preds.append(np.mean(preds))
-                
-                fig_pred = px.line(x=[min_date + timedelta(days=d) for d in future_days], y=future_preds, 
-                                   labels={"x": t("date"), "y": t("predicted_accuracy")}, title=t("30_day_growth_prediction"))
-                fig_pred.add_hline(y=tgt_r, line_dash="dash", line_color="red", annotation_text=t("goal"))
-                fig_pred.update_layout(height=250, margin=dict(l=20, r=20, t=30, b=20))
-                st.plotly_chart(fig_pred, use_container_width=True)
+                with col_ai2:
+                    # 予測推移グラフ（向こう30日）
+                    future_dates = pd.date_range(min_day + timedelta(days=days_future), periods=n_future)
+                    fig_pred = make_pred_fig(tuple(future_dates), tuple(future_preds), tgt_r, st.session_state.language)
+                    st.plotly_chart(fig_pred, use_container_width=True, key="pred_fig")
+
+            render_future_prediction(df, min_day, tgt_r, cor_r)
 
             # 2. 要因分析
             sac.divider(label=t('performance_factor_analysis'), icon='bar-chart-steps', align='left')
             st.caption(t("performance_factor_analysis_desc"))
-            fig_imp = px.bar(importances, x="importance", y="feature", orientation="h", 
-                             title=t("impact_on_accuracy"), labels={"importance": t("importance"), "feature": t("factor")})
-            fig_imp.update_layout(height=200, margin=dict(l=20, r=20, t=30, b=20))
-            st.plotly_chart(fig_imp, use_container_width=True)
+            fig_imp = make_importance_fig(importances, st.session_state.language)
+            st.plotly_chart(fig_imp, use_container_width=True, key="imp_fig")
             
             # 3. AIレコメンド
             sac.divider(label=t('recommended_curriculum'), icon='journal-check', align='left')
             st.caption(t("recommended_curriculum_desc"))
             
-            # 全単元の現在の予測正答率を計算
-            current_days = (datetime.today() - min_date).days
-            recs = []
-            for _, row in unique_pairs.iterrows():
-                try:
-                    s_c = le_subj.transform([row["科目"]])[0]
-                    u_c = le_unit.transform([row["単元"]])[0]
-                    # 今日の予測
-                    p = model_acc.predict([[current_days, s_c, u_c, avg_time, avg_study]])[0]
-                    recs.append({t("subject"): dt(row["科目"]), t("unit"): dt(row["単元"]), t("predicted_accuracy"): p})
-                except:
-                    pass
-            
-            df_recs = pd.DataFrame(recs)
+            # 全単元の現在の予測正答率（予測日の入力と同じキャッシュを引く）
+            target_date = st.session_state.get("ai_target_date", default_target_date)
+            days_future = (target_date - min_day).days
+            unique_pairs, _, _, p_all = _ai_predictions(df_key, df, days_future, current_days, n_future)
+            df_recs = pd.DataFrame({
+                t("subject"): [dt(s) for s in unique_pairs["科目"]],
+                t("unit"): [dt(u) for u in unique_pairs["単元"]],
+                t("predicted_accuracy"): p_all,
+            })
             # 成長ゾーン (40% - 75%)
-            df_growth = df_recs[(df_recs[t("predicted_accuracy")] >= 0.4) & (df_recs[t("predicted_accuracy")] <= 0.75)].sort_values(t("predicted_accuracy"))
+            df_growth = df_recs[df_recs[t("predicted_accuracy")].between(0.4, 0.75)].nsmallest(3, t("predicted_accuracy"))
             
             if not df_growth.empty:
-                for i, row in df_growth.head(3).iterrows():
-                    sac.alert(f"**{row[t('subject')]} - {row[t('unit')]}** ({t('predicted_accuracy')}: {row[t('predicted_accuracy')]:.1%})", icon='fire', color='info')
+                for subj, unit, acc in df_growth.itertuples(index=False):
+                    sac.alert(f"**{subj} - {unit}** ({t('predicted_accuracy')}: {acc:.1%})", icon='fire', color='info')
             else:
                 sac.alert(t("no_growth_zone_units"), icon='check2-circle', color='success')
             
@@ -4540,12 +4963,13 @@ if tab_selection == t("tab_ai_analysis"):
             sac.divider(label=t('learning_flow_visualization'), icon='bar-chart-steps', align='left')
             st.caption(t("learning_flow_visualization_desc"))
             
-            bar_fig = generate_stacked_bar_chart(df)
+            bar_fig = cached_stacked_bar_chart(df_key, df, st.session_state.language)
             if bar_fig:
                 st.plotly_chart(bar_fig, use_container_width=True, config={'displayModeBar': False})
                 
                 # インサイト表示
-                correct_rate = (df["正誤"] == "〇").sum() / len(df)
+                # 全体正答率（取り込み時に作った正解フラグの平均）
+                correct_rate = df["_correct"].mean()
                 st.markdown(f"""
                 <div style="background: linear-gradient(135deg, #eff6ff 0%, #dbeafe 100%); 
                             padding: 16px; border-radius: 12px; border-left: 4px solid {PRIMARY}; margin-top: 16px;">
@@ -4668,8 +5092,6 @@ def render_flashcards():
 
         card = current_cards[current_idx]
         
-        # Import components for HTML embedding
-        import streamlit.components.v1 as components
         
         # カード表示エリア
         # レイアウト変更: カードを上に、ボタンを下に配置
@@ -4907,32 +5329,45 @@ if tab_selection == t("tab_review_notes"):
     if st.session_state.df_notes.empty:
         sac.alert(t("no_notes_yet"), icon='info-circle', color='info')
     else:
-        # 検索機能
-        st.markdown(f'<div style="margin-bottom:8px; font-weight:600; color:#374151;"><i class="bi bi-search" style="margin-right:6px; color:#3b82f6;"></i>{t("search_problem_id_or_memo")}</div>', unsafe_allow_html=True)
-        search_query = st.text_input(t("search"), placeholder=t("enter_keyword"), label_visibility="collapsed")
+        # 検索語の入力・ページ送りではノート一覧だけを再実行する
+        @st.fragment
+        def render_notes_list():
+            # 検索機能
+            st.markdown(f'<div style="margin-bottom:8px; font-weight:600; color:#374151;"><i class="bi bi-search" style="margin-right:6px; color:#3b82f6;"></i>{t("search_problem_id_or_memo")}</div>', unsafe_allow_html=True)
+            search_query = st.text_input(t("search"), placeholder=t("enter_keyword"), label_visibility="collapsed")
         
-        # フィルタリング
-        df_notes_display = st.session_state.df_notes.copy()
-        if search_query:
-            mask = (df_notes_display["問題ID"].astype(str).str.contains(search_query, case=False, na=False)) | \
-                   (df_notes_display["メモ"].astype(str).str.contains(search_query, case=False, na=False))
-            df_notes_display = df_notes_display[mask]
+            # フィルタリング（絞り込みは新しい DataFrame を返すのでコピーは不要）
+            df_notes_display = st.session_state.df_notes
+            if search_query:
+                # 文字列化済みの列はノートの読み込み・削除時に set_notes が作る。検索は正規表現ではなく単純な部分一致で行う
+                id_str, memo_str = st.session_state.df_notes_search
+                mask = id_str.str.contains(search_query, case=False, na=False, regex=False) | \
+                       memo_str.str.contains(search_query, case=False, na=False, regex=False)
+                df_notes_display = df_notes_display[mask.to_numpy()]
         
-        st.markdown(f"**{t('total_notes').format(count=len(df_notes_display))}**")
+            st.markdown(f"**{t('total_notes').format(count=len(df_notes_display))}**")
         
-        # 表示
-        for idx, row in df_notes_display.iterrows():
-            with st.expander(f"**{row['問題ID']}** - {row['登録日時']}", expanded=False):
-                st.markdown(row['メモ'])
-                
-                # 削除ボタン
-                def delete_note(idx_to_drop):
-                    st.session_state.df_notes = st.session_state.df_notes.drop(idx_to_drop).reset_index(drop=True)
-                    st.session_state.df_notes.to_csv(user_notes_path, index=False)
-                    # sac.alertはrerunしないと消えないため、st.toastを使うか、rerunなしでUI更新を待つ
-                    st.toast(t("deleted"), icon="✅")
+            # 削除ボタン
+            def delete_note(idx_to_drop):
+                set_notes(st.session_state.df_notes.drop(idx_to_drop).reset_index(drop=True))
+                save_notes_backup(st.session_state.df_notes, user_notes_path)
+                # sac.alertはrerunしないと消えないため、st.toastを使うか、rerunなしでUI更新を待つ
+                st.toast(t("deleted"), icon="✅")
+        
+            # 表示（1ページ分だけウィジェットを作る）
+            n_pages = max(1, -(-len(df_notes_display) // NOTES_PAGE_SIZE))
+            page = 1
+            if n_pages > 1:
+                page = sac.pagination(total=len(df_notes_display), page_size=NOTES_PAGE_SIZE, align='center', key="notes_page")
+                page = min(max(page or 1, 1), n_pages)
+            view = df_notes_display.iloc[(page - 1) * NOTES_PAGE_SIZE:page * NOTES_PAGE_SIZE]
+        
+            for row in view.itertuples(index=True):
+                with st.expander(f"**{row.問題ID}** - {row.登録日時}", expanded=False):
+                    st.markdown(row.メモ)
+                    st.button(t("delete"), key=f"del_note_{row.Index}", on_click=delete_note, args=(row.Index,))
 
-                st.button(t("delete"), key=f"del_note_{idx}", on_click=delete_note, args=(idx,))
+        render_notes_list()
 
 if tab_selection == t("tab_settings"):
     sac.divider(label=t('settings'), icon='gear', align='center')
@@ -5034,7 +5469,7 @@ if tab_selection == t("tab_settings"):
     st.caption(t("weekly_report_desc"))
     
     if st.button(t("generate_report"), type="primary", use_container_width=True):
-        report = generate_weekly_report(df)
+        report = cached_weekly_report(df_key, df, st.session_state.language)
         st.markdown(report, unsafe_allow_html=True)
         
         # ダウンロードボタン
@@ -5045,7 +5480,7 @@ if tab_selection == t("tab_settings"):
         
         with col_dl2:
             # PDF出力
-            pdf_data = generate_pdf_report(report, st.session_state.current_user, df)
+            pdf_data = cached_pdf_report(report, st.session_state.current_user, df_key, df)
             if pdf_data:
                 st.download_button(
                     label=t("download_pdf"),
@@ -5059,7 +5494,7 @@ if tab_selection == t("tab_settings"):
         
         with col_dl3:
             # Excel出力（学習データ）
-            excel_data = generate_excel_report(df, st.session_state.current_user)
+            excel_data = cached_excel_report(df_key, df, st.session_state.current_user)
             if excel_data:
                 st.download_button(
                     label=t("download_excel"),
@@ -5081,42 +5516,9 @@ st.markdown("</div>", unsafe_allow_html=True)
 
 # ===== カスタム通知（トースト）の表示 =====
 if st.session_state.get("show_success_toast", False):
-    import time
-    toast_id = int(time.time() * 1000)
-    st.markdown(f"""
-    <style>
-    @keyframes slideInFadeOut {{
-        0% {{ transform: translateX(100%); opacity: 0; }}
-        10% {{ transform: translateX(0); opacity: 1; }}
-        80% {{ transform: translateX(0); opacity: 1; }}
-        100% {{ transform: translateX(100%); opacity: 0; visibility: hidden; }}
-    }}
-    .custom-toast-{toast_id} {{
-        position: fixed;
-        top: 100px;
-        right: 20px;
-        background-color: #ffffff;
-        border-left: 5px solid #10b981;
-        padding: 16px 24px;
-        border-radius: 8px;
-        box-shadow: 0 10px 15px -3px rgba(0, 0, 0, 0.1), 0 4px 6px -2px rgba(0, 0, 0, 0.05);
-        display: flex;
-        align-items: center;
-        gap: 12px;
-        z-index: 10000;
-        animation: slideInFadeOut 4s forwards;
-    }}
-    .toast-icon {{
-        color: #10b981;
-        font-size: 1.5rem;
-    }}
-    .toast-message {{
-        color: #1f2937;
-        font-weight: 600;
-        font-size: 1rem;
-    }}
-    </style>
-    <div class="custom-toast-{toast_id}">
+    # スタイルは冒頭のグローバルCSSで定義済み。通知本体の要素だけを出す
+    st.markdown("""
+    <div class="custom-toast">
         <i class="bi bi-check-circle-fill toast-icon"></i>
         <span class="toast-message">データを追加しました</span>
     </div>
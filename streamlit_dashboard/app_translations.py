@@ -365,6 +365,8 @@ TRANSLATIONS = {
         "study_unit": "学習単元",
         "type": "タイプ",
         "registered_success": "登録しました！",
+        "plan_done": "完了",
+        "register_selected": "選択した単元をカレンダーに登録",
         "error": "エラー",
         "roadmap_to_pass": "合格ロードマップ",
         "analysis_graphs": "分析グラフ",
@@ -860,6 +862,8 @@ TRANSLATIONS = {
         "study_unit": "Unit",
         "type": "Type",
         "registered_success": "Registered!",
+        "plan_done": "Done",
+        "register_selected": "Add selected units to Calendar",
         "error": "Error",
         "roadmap_to_pass": "Roadmap to Pass",
         "analysis_graphs": "Analysis Graphs",
@@ -1420,6 +1424,8 @@ TRANSLATIONS = {
         "study_unit": "单元",
         "type": "类型",
         "registered_success": "已注册！",
+        "plan_done": "完成",
+        "register_selected": "将所选单元添加到日历",
         "error": "错误",
         "roadmap_to_pass": "通关路线图",
         "analysis_graphs": "分析图表",